@@ -0,0 +1,365 @@
+"""Assembler and disassembler for Maua-V programs.
+
+Source files hold one instruction or directive per line; ``;`` and ``#``
+start a comment. Mnemonics follow the short opcode names of Program.NAMES
+without the dots, and every ALU operation has its own mnemonic:
+
+    wm   ADDRESS, VALUE        ; W.M.
+    wr   REG, VALUE            ; W.R.
+    add  DEST, REG1, REG2      ; A.L.O. (also sub, mul, div, pow, mod, and,
+                               ;  or, nand, nor, xor, xnor, not DEST, REG1)
+    vadd DEST, REG1, REG2      ; vector A.L.O. on the 8-bit lanes (also vsub,
+                               ;  vand, vor, vxor, vnot DEST, REG1, vins)
+    alo  OP, DEST, REG1, REG2  ; A.L.O. with a numeric operation
+    mm   ADDRESS, AUX, DEST    ; M.M.
+    mr   REG, AUX, DEST        ; M.R.
+    mrm  REG, ADDRESS          ; M.R.M.
+    mmr  ADDRESS, REG          ; M.M.R.
+    rr   REG                   ; R.R.
+    cmp  REG1, REG2            ; C.M.P.
+    jmp  TARGET                ; J.M.P. (also beq, bne, blt, bge)
+    bm   SRC, DEST, LENGTH     ; B.M.: copy LENGTH words from the address in
+                               ;  register SRC to the address in DEST
+
+Registers are written ``r0`` to ``r31``, or up to the register count of
+the machine given by ``--registers``. Numbers may be decimal, ``0x`` or
+``0b``. Directives name values before they are used:
+
+    .equ NAME, VALUE           ; constant
+    .reg NAME, REG             ; register alias
+    .mem NAME, ADDRESS         ; memory label
+
+A branch TARGET is a label, defined by ``NAME:`` before an instruction, or
+a signed offset from the branch itself. Labels may come after the branches
+that use them.
+
+A program is assembled in a single pass, one line at a time, and written
+out as it goes. Only a branch to a label not defined yet, and the
+instructions after it, wait until the label appears and the offset is
+filled in.
+
+The sizes of the machine are a Program.geometry(); any other than the
+default is assembled into the packed layout of ``encoder V2.py``.
+"""
+
+import argparse
+import os
+import sys
+
+import Program
+
+# ALU operation codes by mnemonic, in the order of CPU.OPERATIONS and, from
+# Program.VECTOR on, of CPU.VECTOR_OPERATIONS.
+OPERATIONS = {
+    'add': 0, 'sub': 1, 'mul': 2, 'div': 3, 'pow': 4, 'mod': 5, 'and': 6,
+    'or': 7, 'nand': 8, 'nor': 9, 'xor': 10, 'xnor': 11, 'not': 12,
+    'vadd': 16, 'vsub': 17, 'vand': 18, 'vor': 19, 'vxor': 20, 'vnot': 21, 'vins': 22,
+}
+OPERATION_NAMES = {code: name for name, code in OPERATIONS.items()}
+
+# Opcode of each mnemonic, from Program.NAMES ('M.R.M.' -> 'mrm').
+OPCODES = {name.replace('.', '').lower(): opcode for opcode, name in Program.NAMES.items()}
+MNEMONICS = {opcode: name for name, opcode in OPCODES.items()}
+
+# Function of each compare and branch mnemonic, from Program.FUNCTIONS.
+FUNCTIONS = {name.replace('.', '').lower(): function for function, name in Program.FUNCTIONS.items() if function}
+FUNCTION_NAMES = {function: name for name, function in FUNCTIONS.items()}
+
+# Kind of each operand, in source order, and the Program.FIELDS slot it goes to.
+REG, MEM, IMM, LABEL = 'registrador', 'endereço', 'valor', 'rótulo'
+OPERANDS = {
+    0: ((MEM, 0), (IMM, 1)),
+    1: ((REG, 0), (IMM, 1)),
+    3: ((MEM, 0), (MEM, 1), (MEM, 2)),
+    4: ((REG, 0), (REG, 1), (REG, 2)),
+    5: ((REG, 0), (MEM, 1)),
+    6: ((MEM, 0), (REG, 1)),
+    7: ((REG, 0),),
+}
+# A.L.O. operands: destination, reg1, reg2 into fields 3, 0 and 1.
+ALU_OPERANDS = ((REG, 3), (REG, 0), (REG, 1))
+# Compare operands into fields 0 and 2; branch targets into field 3;
+# block move registers into fields 0 and 2 and its length into field 3.
+COMPARE_OPERANDS = ((REG, 0), (REG, 2))
+BRANCH_OPERANDS = ((LABEL, 3),)
+BLOCK_OPERANDS = ((REG, 0), (REG, 2), (IMM, 3))
+
+
+class AssemblyError(ValueError):
+    """Raised for a source line that cannot be assembled."""
+
+    def __init__(self, filename, line, message):
+        super().__init__(f"{filename}:{line}: {message}")
+        self.filename = filename
+        self.line = line
+
+
+def _number(text):
+    """Parse a decimal, 0x or 0b number; return None when text is not one."""
+    try:
+        return int(text, 0)
+    except ValueError:
+        return None
+
+
+def _register(text, count):
+    """Parse 'rN' with N below count; return None when text is not a register."""
+    if len(text) > 1 and text[0] in 'rR' and text[1:].isdigit():
+        number = int(text[1:])
+        if number < count:
+            return number
+    return None
+
+
+class Assembler:
+    """Single-pass assembler keeping the symbols defined so far."""
+
+    def __init__(self, filename="<fonte>", geometry=Program.DEFAULT):
+        self.filename = filename
+        self.geometry = geometry
+        self.symbols = {}
+        self.line = 0
+        # Instructions assembled so far, and the label the last one is
+        # waiting for, if any
+        self.count = 0
+        self.forward = None
+
+    def error(self, message, line=None):
+        return AssemblyError(self.filename, self.line if line is None else line, message)
+
+    def value(self, text, kind):
+        """Resolve an operand of the given kind to an integer."""
+        if kind == LABEL:
+            return self.target(text)
+        if kind == REG:
+            number = _register(text, self.geometry['register_count'])
+            if number is not None:
+                return number
+            if self.symbols.get(text, (None,))[0] == REG:
+                return self.symbols[text][1]
+            raise self.error(f"esperado um registrador, encontrado '{text}'")
+        number = _number(text)
+        if number is not None:
+            return number
+        symbol = self.symbols.get(text)
+        if symbol is None:
+            raise self.error(f"nome não definido: '{text}'")
+        if symbol[0] in (REG, LABEL) or (kind == IMM and symbol[0] == MEM):
+            raise self.error(f"'{text}' é um {symbol[0]}, esperado um {kind}")
+        return symbol[1]
+
+    def offset(self, offset, line=None):
+        """Return the offset field of a signed branch offset on a source line."""
+        limit = 1 << (Program.OFFSET_BITS - 1)
+        if not -limit <= offset < limit:
+            raise self.error(f"desvio de {offset} instruções fora do alcance ({-limit} a {limit - 1})", line)
+        return offset % (1 << Program.OFFSET_BITS)
+
+    def target(self, text):
+        """Resolve a branch target to its offset field; 0 for a label not defined yet."""
+        number = _number(text)
+        if number is not None:
+            return self.offset(number)
+        symbol = self.symbols.get(text)
+        if symbol is None:
+            if not text.isidentifier():
+                raise self.error(f"rótulo inválido: '{text}'")
+            self.forward = text
+            return 0
+        if symbol[0] != LABEL:
+            raise self.error(f"'{text}' é um {symbol[0]}, esperado um {LABEL}")
+        return self.offset(symbol[1] - self.count)
+
+    def label(self, symbol, waiting):
+        """Define a label at the next instruction and fill in the branches waiting for it."""
+        if (_register(symbol, self.geometry['register_count']) is not None or symbol.lower() in OPCODES
+                or symbol.lower() in FUNCTIONS):
+            raise self.error(f"nome inválido: '{symbol}'")
+        if symbol in self.symbols:
+            raise self.error(f"'{symbol}' já foi definido")
+        self.symbols[symbol] = (LABEL, self.count)
+        for entry in waiting:
+            word, name, line, pc = entry
+            if name == symbol:
+                field = self.offset(self.count - pc, line)
+                entry[:2] = word | Program.encode(7, [0, 0, 0, field], self.geometry), None
+
+    def directive(self, name, operands):
+        """Define a symbol from a .equ, .reg or .mem directive."""
+        kinds = {'.equ': IMM, '.reg': REG, '.mem': MEM}
+        if name not in kinds:
+            raise self.error(f"diretiva desconhecida: {name}")
+        if len(operands) != 2:
+            raise self.error(f"{name} espera um nome e um valor")
+        symbol, text = operands
+        if (not symbol.isidentifier() or _register(symbol, self.geometry['register_count']) is not None or symbol.lower() in OPCODES
+                or symbol.lower() in FUNCTIONS):
+            raise self.error(f"nome inválido: '{symbol}'")
+        if symbol in self.symbols:
+            raise self.error(f"'{symbol}' já foi definido")
+        self.symbols[symbol] = (kinds[name], self.value(text, kinds[name]))
+
+    def instruction(self, mnemonic, operands):
+        """Encode one instruction into a word of the machine's instruction layout."""
+        name = mnemonic.lower()
+        fields = [0, 0, 0, 0]
+        if name in OPERATIONS or name == 'alo':
+            opcode = 2
+            if name == 'alo':
+                if not operands:
+                    raise self.error("alo espera a operação e três registradores")
+                fields[2] = self.value(operands[0], IMM)
+                operands = operands[1:]
+            else:
+                fields[2] = OPERATIONS[name]
+            layout = ALU_OPERANDS[:2] if name in ('not', 'vnot') and len(operands) == 2 else ALU_OPERANDS
+        elif name in FUNCTIONS:
+            opcode = 7
+            fields[1] = FUNCTIONS[name]
+            layout = {'cmp': COMPARE_OPERANDS, 'bm': BLOCK_OPERANDS}.get(name, BRANCH_OPERANDS)
+        elif name in OPCODES:
+            opcode = OPCODES[name]
+            layout = OPERANDS[opcode]
+        else:
+            raise self.error(f"instrução desconhecida: {mnemonic}")
+        if len(operands) != len(layout):
+            raise self.error(f"{name} espera {len(layout)} operandos, recebeu {len(operands)}")
+        for text, (kind, slot) in zip(operands, layout):
+            fields[slot] = self.value(text, kind)
+        try:
+            return Program.encode(opcode, fields[:len(Program.FIELDS[opcode])], self.geometry)
+        except ValueError as error:
+            raise self.error(str(error)) from None
+
+    def assemble(self, lines):
+        """Yield the word of every instruction in an iterable of source lines."""
+        # Instructions held back since the first branch to a label not
+        # defined yet: [word, label or None once filled in, line, pc]
+        waiting = []
+        for self.line, text in enumerate(lines, 1):
+            for mark in ';#':
+                text = text.split(mark, 1)[0]
+            symbol, colon, rest = text.partition(':')
+            if colon and symbol.strip().isidentifier():
+                self.label(symbol.strip(), waiting)
+                text = rest
+                while waiting and waiting[0][1] is None:
+                    yield waiting.pop(0)[0]
+            parts = text.split(None, 1)
+            if not parts:
+                continue
+            operands = [item.strip() for item in parts[1].split(',')] if len(parts) > 1 else []
+            if any(not item for item in operands):
+                raise self.error("operando vazio")
+            if parts[0].startswith('.'):
+                self.directive(parts[0].lower(), operands)
+                continue
+            self.forward = None
+            word = self.instruction(parts[0], operands)
+            if waiting or self.forward:
+                waiting.append([word, self.forward, self.line, self.count])
+            else:
+                yield word
+            self.count += 1
+        for word, name, line, pc in waiting:
+            if name is not None:
+                raise self.error(f"rótulo não definido: '{name}'", line)
+            yield word
+
+
+def assemble_file(source, destination, geometry=Program.DEFAULT):
+    """Assemble a source file into a program file; return the instruction count.
+
+    The destination is written as text, or packed when it ends in ``.bin``.
+    The program goes to a temporary file next to it, which only replaces the
+    destination once the whole source assembled, so an error leaves an
+    existing destination as it was.
+    """
+    root, extension = os.path.splitext(destination)
+    temporary = f"{root}.tmp{extension}"
+    with open(source, 'r') as file:
+        try:
+            count = Program.stream_words(temporary, Assembler(source, geometry).assemble(file),
+                                         word_bits=geometry['word_bits'])
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+    os.replace(temporary, destination)
+    return count
+
+
+def disassemble(words, geometry=Program.DEFAULT):
+    """Yield one source line per instruction word."""
+    program = Program.decode_words(words, geometry)
+    for base in range(0, len(program), Program.RECORD):
+        opcode = program[base]
+        fields = program[base + 1:base + Program.RECORD]
+        if opcode == 2:
+            reg1, reg2, operation, dest = fields
+            name = OPERATION_NAMES.get(operation)
+            if name is None:
+                yield f"alo {operation}, r{dest}, r{reg1}, r{reg2}"
+            elif name in ('not', 'vnot') and reg2 == 0:
+                yield f"{name} r{dest}, r{reg1}"
+            else:
+                yield f"{name} r{dest}, r{reg1}, r{reg2}"
+            continue
+        if opcode == 7 and fields[1]:
+            register, function, register2, offset = fields
+            if function == FUNCTIONS['cmp']:
+                yield f"cmp r{register}, r{register2}"
+            elif function == FUNCTIONS['bm']:
+                yield f"bm r{register}, r{register2}, {offset}"
+            else:
+                if offset >> (Program.OFFSET_BITS - 1):
+                    offset -= 1 << Program.OFFSET_BITS
+                yield f"{FUNCTION_NAMES[function]} {offset}"
+            continue
+        operands = []
+        for kind, slot in OPERANDS[opcode]:
+            operands.append(f"r{fields[slot]}" if kind == REG else str(fields[slot]))
+        yield f"{MNEMONICS[opcode]} " + ", ".join(operands)
+
+
+def disassemble_file(source, destination, geometry=Program.DEFAULT):
+    """Disassemble a program file in either format; return the instruction count."""
+    words = Program.read_words(source, geometry['word_bits'])
+    with open(destination, 'w') as file:
+        for linha in disassemble(words, geometry):
+            file.write(linha + '\n')
+    return len(words)
+
+
+def main():
+    """Assemble, or with -d disassemble, a file given on the command line."""
+    parser = argparse.ArgumentParser(description="Montador e desmontador de programas Maua-V.")
+    parser.add_argument("source", help="fonte em assembly, ou programa (texto ou .bin) com -d")
+    parser.add_argument("-o", "--output", default=None,
+                        help="arquivo de saída (padrão: bits.txt; com -d, o nome do programa com .s)")
+    parser.add_argument("-d", "--disassemble", action="store_true", help="desmonta um programa em assembly")
+    parser.add_argument("--memory-size", type=int, default=Program.MEMORY_SIZE, help="palavras de memória")
+    parser.add_argument("--registers", type=int, default=Program.REGISTER_COUNT, help="número de registradores")
+    parser.add_argument("--word-width", type=int, default=Program.WORD_WIDTH, help="bits por palavra de dados")
+    args = parser.parse_args()
+    try:
+        geometry = Program.geometry(args.memory_size, args.registers, args.word_width)
+    except ValueError as error:
+        parser.error(str(error))
+
+    try:
+        if args.disassemble:
+            output = args.output or os.path.splitext(args.source)[0] + '.s'
+            count = disassemble_file(args.source, output, geometry)
+        else:
+            output = args.output or "bits.txt"
+            count = assemble_file(args.source, output, geometry)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f"{count} instruções gravadas em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,162 @@
+"""Run many Maua-V programs in parallel and collect their final state.
+
+Programs come from a directory (every ``.txt`` and ``.bin`` file in it) or
+from a manifest file listing one program path per line. Each program runs
+in a worker process of a pool, with its own timeout; a program that fails
+or times out is recorded as such and does not stop the batch. The results
+(final registers and memory, cycle count, wall time) are written to a JSON
+or CSV file.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import signal
+import time
+
+import Program
+
+# MyHDL keeps every Signal ever created in a module-level list, so a worker
+# slows down with each design it elaborates. Recycle workers regularly.
+TASKS_PER_WORKER = 50
+
+FIELDS = ('program', 'status', 'cycles', 'seconds', 'error', 'registers', 'memory')
+
+
+class ProgramTimeout(Exception):
+    """Raised inside a worker when a program runs past its timeout."""
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Raise ProgramTimeout if the block runs for more than ``seconds``.
+
+    Uses SIGALRM, so it only takes effect where signal.setitimer exists.
+    """
+    if not seconds or not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise ProgramTimeout(f"passou de {seconds} s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def find_programs(source):
+    """List the program files of a directory or of a manifest file."""
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        return [os.path.join(source, name) for name in names if name.endswith(('.txt', '.bin'))]
+    base = os.path.dirname(source)
+    programs = []
+    with open(source, 'r') as file:
+        for linha in file:
+            linha = linha.strip()
+            if linha and not linha.startswith('#'):
+                programs.append(os.path.join(base, linha))
+    return programs
+
+
+def run_program(path, engine='myhdl', timeout=None, max_cycles=None, words=None):
+    """Run one program and return its result record; never raises.
+
+    words: instruction words to run instead of loading ``path``, which then
+           only names the program in the record
+    """
+    record = {'program': path, 'status': 'ok', 'cycles': None, 'seconds': None,
+              'error': None, 'registers': None, 'memory': None}
+    start = time.perf_counter()
+    try:
+        with deadline(timeout):
+            program = Program.load(path) if words is None else Program.decode_words(words)
+            if engine == 'fast':
+                import FastCPU
+                state = FastCPU.run(program, verbose=False, max_cycles=max_cycles)
+            else:
+                import CPU
+                with contextlib.redirect_stdout(io.StringIO()):
+                    state = CPU.simulate(program, max_cycles)
+        record['cycles'] = state['cycles']
+        if state['halted']:
+            record['registers'] = state['registers']
+            record['memory'] = state['memory']
+        else:
+            record['status'] = 'truncated'
+    except ProgramTimeout as error:
+        record['status'] = 'timeout'
+        record['error'] = str(error)
+    except Exception as error:
+        record['status'] = 'error'
+        record['error'] = f"{type(error).__name__}: {error}"
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def _run_task(task):
+    """Pool entry point: unpack the arguments of run_program."""
+    return run_program(*task)
+
+
+def run_batch(programs, jobs=None, engine='myhdl', timeout=None, max_cycles=None):
+    """Run the programs in a process pool and return their records in order."""
+    tasks = [(path, engine, timeout, max_cycles) for path in programs]
+    with multiprocessing.Pool(jobs, maxtasksperchild=TASKS_PER_WORKER) as pool:
+        return list(pool.imap(_run_task, tasks, chunksize=1))
+
+
+def write_results(records, filename):
+    """Write the records as JSON, or as CSV when the file ends in ``.csv``."""
+    if filename.endswith('.csv'):
+        with open(filename, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                for key in ('registers', 'memory'):
+                    if row[key] is not None:
+                        row[key] = ' '.join(str(value) for value in row[key])
+                writer.writerow(row)
+    else:
+        with open(filename, 'w') as file:
+            json.dump(records, file)
+
+
+def main():
+    """Run a batch of programs from the command line."""
+    parser = argparse.ArgumentParser(description="Executa vários programas Maua-V em paralelo.")
+    parser.add_argument("source", help="diretório com programas (.txt/.bin) ou manifesto com um caminho por linha")
+    parser.add_argument("-o", "--output", default="results.json", help="arquivo de resultados (.json ou .csv)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="processos em paralelo (padrão: número de CPUs)")
+    parser.add_argument("--timeout", type=float, default=None, help="tempo máximo por programa, em segundos")
+    parser.add_argument("--max-cycles", type=int, default=None, help="número máximo de ciclos por programa")
+    parser.add_argument("--engine", choices=("myhdl", "fast"), default="myhdl",
+                        help="CPU.system() no MyHDL ou o modelo rápido do FastCPU")
+    args = parser.parse_args()
+
+    programs = find_programs(args.source)
+    start = time.perf_counter()
+    records = run_batch(programs, args.jobs, args.engine, args.timeout, args.max_cycles)
+    elapsed = time.perf_counter() - start
+    write_results(records, args.output)
+
+    statuses = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+    print(f"{len(records)} programas em {elapsed:.2f} s ({summary}) -> {args.output}")
+    return 0 if statuses.get('ok', 0) == len(records) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,293 @@
+"""Throughput benchmarks for the simulator, the decoder and the generator.
+
+Every workload is built from a fixed seed, so two runs measure the same
+programs. The suite reports:
+
+- for ``CPU.system()`` (and the FastCPU model), per instruction class:
+  simulated cycles/s, instructions/s and peak Python memory;
+- for ``Decoder.parse_file`` and ``Decoder.decode_file``: decoded
+  instructions/s;
+- for ``RandomBitGenerator``: generated instructions/s;
+- for the block move: the simulated cycles of a B.M. against the same
+  copy done word by word with M.M.R. and M.R.M.
+
+Results are written as JSON and can be compared against a stored baseline.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+import Program
+
+# Instruction classes measured on the simulator, by opcode; 'mixed' uses all.
+WORKLOADS = {
+    'W.M.': 0,
+    'W.R.': 1,
+    'A.L.O.': 2,
+    'M.M.': 3,
+    'M.R.': 4,
+    'M.R.M.': 5,
+    'M.M.R.': 6,
+    'V.A.L.O.': 2,
+    'mixed': None,
+}
+
+# ALU operations that can never leave the 8-bit result range, and the
+# vector operations the 'V.A.L.O.' workload uses (none of them can fail).
+SAFE_OPERATIONS = (6, 7, 10, 12)
+VECTOR_OPERATIONS = tuple(range(Program.VECTOR, Program.VECTOR + 7))
+
+SEED = 2024
+
+# Words copied by the block-move comparison, from SOURCE to DESTINATION.
+BLOCK_LENGTHS = (1, 4, 16, 64)
+SOURCE = 0
+DESTINATION = 64
+
+
+def workload(name, count, seed=SEED):
+    """Return ``count`` instruction words of one class (or of all, for 'mixed')."""
+    rng = random.Random(f"{seed}-{name}")
+    words = []
+    for _ in range(count):
+        opcode = WORKLOADS[name]
+        if opcode is None:
+            opcode = rng.randrange(len(Program.FIELDS))
+        # Opcode 7 stays R.R.: only its register is drawn, so the mix has no
+        # compares or branches and the same words as before them
+        slices = Program.FIELDS[opcode][:1] if opcode == 7 else Program.FIELDS[opcode]
+        fields = [rng.randrange(1 << (b - a)) for a, b in slices]
+        if opcode == 2:
+            fields[2] = rng.choice(VECTOR_OPERATIONS if name == 'V.A.L.O.' else SAFE_OPERATIONS)
+        words.append(Program.encode(opcode, fields))
+    return words
+
+
+def best_time(function, repeat):
+    """Run ``function`` ``repeat`` times; return its last result and the best wall time."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def peak_memory(function):
+    """Return the peak Python memory, in bytes, allocated while ``function`` runs."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_simulator(engine, words, repeat):
+    """Measure one engine ('myhdl' or 'fast') on a program."""
+    program = Program.decode_words(words)
+    if engine == 'myhdl':
+        import CPU
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return CPU.simulate(program)
+    else:
+        import FastCPU
+
+        def run():
+            return FastCPU.run(program, verbose=False)
+
+    state, seconds = best_time(run, repeat)
+    return {
+        'instructions': len(words),
+        'cycles': state['cycles'],
+        'seconds': seconds,
+        'cycles_per_second': state['cycles'] / seconds,
+        'instructions_per_second': len(words) / seconds,
+        'peak_bytes': peak_memory(run),
+    }
+
+
+def bench_decoder(count, repeat, seed=SEED):
+    """Measure Decoder.parse_file and the NumPy decoder on text and binary corpora."""
+    import Decoder
+
+    words = workload('mixed', count, seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        text = os.path.join(directory, 'corpus.txt')
+        binary = os.path.join(directory, 'corpus.bin')
+        Program.write_words(text, words)
+        Program.write_words(binary, words)
+        for name, function in (
+            ('parse_file', lambda: Decoder.parse_file(text)),
+            ('decode_file_text', lambda: Decoder.decode_file(text)),
+            ('decode_file_bin', lambda: Decoder.decode_file(binary)),
+        ):
+            _, seconds = best_time(function, repeat)
+            results[name] = {'instructions': count, 'seconds': seconds,
+                             'instructions_per_second': count / seconds}
+    return results
+
+
+def bench_generator(count, repeat, seed=SEED):
+    """Measure the interactive-path generator and the batched, streaming one."""
+    import RandomBitGenerator
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        def legacy():
+            random.seed(seed)
+            binaries = RandomBitGenerator.generate_32bit_binaries(count, mode='alu')
+            RandomBitGenerator.save_to_file(binaries, os.path.join(directory, 'legacy.txt'))
+
+        def streaming(filename):
+            chunks = RandomBitGenerator.generate_words(total=count, mix={'alu': 1, 'write_mem': 1}, seed=seed)
+            RandomBitGenerator.stream_to_file(chunks, count, os.path.join(directory, filename))
+
+        for name, function in (
+            ('generate_32bit_binaries', legacy),
+            ('generate_words_text', lambda: streaming('stream.txt')),
+            ('generate_words_bin', lambda: streaming('stream.bin')),
+        ):
+            _, seconds = best_time(function, repeat)
+            results[name] = {'instructions': count, 'seconds': seconds,
+                             'instructions_per_second': count / seconds}
+    return results
+
+
+def block_copy(length, block_move):
+    """Return the words of a program copying ``length`` memory words."""
+    if block_move:
+        return [Program.encode(1, [1, SOURCE]), Program.encode(1, [2, DESTINATION]),
+                Program.encode(7, [1, 7, 2, length])]
+    words = []
+    for k in range(length):
+        words.append(Program.encode(6, [SOURCE + k, 1]))
+        words.append(Program.encode(5, [1, DESTINATION + k]))
+    return words
+
+
+def bench_block_move(lengths=BLOCK_LENGTHS, engine='myhdl'):
+    """Compare the cycles of B.M. with the word-by-word copy, per length."""
+    if engine == 'myhdl':
+        import CPU
+
+        def cycles(words):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return CPU.simulate(Program.decode_words(words))['program_cycles']
+    else:
+        import FastCPU
+
+        def cycles(words):
+            return FastCPU.run(Program.decode_words(words), verbose=False)['cycles'] - FastCPU.DUMP_CYCLES
+
+    results = {}
+    for length in lengths:
+        word_by_word = cycles(block_copy(length, False))
+        block_move = cycles(block_copy(length, True))
+        results[str(length)] = {'words': length, 'word_by_word_cycles': word_by_word,
+                                'block_move_cycles': block_move, 'speedup': word_by_word / block_move}
+    return results
+
+
+def run_suite(size=200, corpus=100000, repeat=3, engines=('myhdl', 'fast'), seed=SEED):
+    """Run every benchmark and return the results as a JSON-ready dict."""
+    results = {}
+    for engine in engines:
+        for name in WORKLOADS:
+            results[f"simulator/{engine}/{name}"] = bench_simulator(engine, workload(name, size, seed), repeat)
+    for name, result in bench_decoder(corpus, repeat, seed).items():
+        results[f"decoder/{name}"] = result
+    for name, result in bench_generator(corpus, repeat, seed).items():
+        results[f"generator/{name}"] = result
+    for name, result in bench_block_move(engine=engines[0]).items():
+        results[f"block-move/{name}"] = result
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'size': size,
+            'corpus': corpus,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.10):
+    """Compare two result sets; return report lines and the regressed metrics.
+
+    Rates (``*_per_second``) regress when they drop, and ``peak_bytes``
+    when it grows, by more than ``tolerance``.
+    """
+    lines = []
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        for metric, value in result.items():
+            if not (metric.endswith('_per_second') or metric == 'peak_bytes') or metric not in base:
+                continue
+            ratio = value / base[metric] if base[metric] else float('inf')
+            worse = ratio < 1 - tolerance if metric.endswith('_per_second') else ratio > 1 + tolerance
+            lines.append(f"{name:45} {metric:25} {base[metric]:14.1f} -> {value:14.1f} ({ratio:6.2f}x)"
+                         + ("  REGRESSION" if worse else ""))
+            if worse:
+                regressions.append(f"{name}:{metric}")
+    return lines, regressions
+
+
+def main():
+    """Run the suite, save it and optionally compare it with a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmarks do simulador, do decodificador e do gerador.")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="variação aceita antes de acusar regressão")
+    parser.add_argument("--size", type=int, default=200, help="instruções por programa do simulador")
+    parser.add_argument("--corpus", type=int, default=100000, help="instruções do decodificador e do gerador")
+    parser.add_argument("--repeat", type=int, default=3, help="repetições; vale o melhor tempo")
+    parser.add_argument("--engines", default="myhdl,fast", help="motores do simulador: myhdl, fast")
+    parser.add_argument("--seed", type=int, default=SEED, help="semente das cargas de trabalho")
+    args = parser.parse_args()
+
+    current = run_suite(args.size, args.corpus, args.repeat, tuple(args.engines.split(',')), args.seed)
+    with open(args.output, 'w') as file:
+        json.dump(current, file, indent=2)
+
+    for name, result in current['results'].items():
+        if 'speedup' in result:
+            print(f"{name:45} {result['word_by_word_cycles']:7} -> {result['block_move_cycles']:5} ciclos"
+                  f" ({result['speedup']:.2f}x)")
+            continue
+        rate = result.get('cycles_per_second', result['instructions_per_second'])
+        unit = 'ciclos/s' if 'cycles_per_second' in result else 'instr/s'
+        print(f"{name:45} {rate:14.1f} {unit}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        lines, regressions = compare(current, baseline, args.tolerance)
+        print()
+        for line in lines:
+            print(line)
+        if regressions:
+            print(f"\n{len(regressions)} regressões")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+"""Compare and branch instructions and the branch predictor model.
+
+Opcode 7 has a function in field 1. Function 0 is R.R.; C.M.P. compares
+the low lanes of two registers (fields 0 and 2) and keeps the result in
+``flags``; J.M.P. and the conditional branches move the program counter by
+the signed offset in field 3, relative to the branch itself. B.E.Q., B.N.E.,
+B.L.T. and B.G.E. test the flags of the last C.M.P. (unsigned). A branch to
+the instruction after the last one ends the program. Function 7 is B.M.,
+the block move the DMA engine of CPU.py carries out.
+
+UC fetches the instruction after a branch before the branch resolves, from
+the address the predictor guesses. Conditional branches are predicted
+backward taken, forward not taken (``static``) or by a table of 2-bit
+saturating counters indexed by the program counter (``2bit``); jumps are
+always taken. Without a branch-target buffer the target of a taken
+prediction is only known once the branch is decoded, which costs one
+bubble cycle. With one, a hit gives the target at no cost and a miss makes
+the fetch fall through. A wrong guess costs ``penalty`` cycles while UC
+throws the fetched instruction away.
+
+Like the data cache, the predictor only models timing: the program does the
+same whatever it guesses.
+"""
+
+import Program
+
+# Function codes of opcode 7 (Program.FUNCTIONS).
+CLEAR, COMPARE, JUMP, BEQ, BNE, BLT, BGE, BLOCK_MOVE = range(8)
+# (opcode, function) pairs of the instructions used() looks for, and the
+# byte table turning an opcode into a mask of the opcode-7 records.
+_USED = frozenset((7, function) for function in range(COMPARE, 1 << Program.FUNCTION_BITS))
+_OPCODE_7 = bytes(0xFF if opcode == 7 else 0 for opcode in range(256))
+
+# Bits of flags.
+EQUAL = 1
+LESS = 2
+FLAG_BITS = 2
+
+PREDICTORS = ('static', '2bit')
+
+# Clock edges of a branch when it is predicted right with no bubble: the
+# edge it resolves on and the idle edge.
+BRANCH_EDGES = 2
+
+
+def compare(a, b):
+    """Return the flags C.M.P. sets for the values a and b."""
+    return (EQUAL if a == b else 0) | (LESS if a < b else 0)
+
+
+def taken(function, flags):
+    """Tell whether a jump or branch function is taken with the given flags."""
+    if function == JUMP:
+        return True
+    if function == BEQ:
+        return bool(flags & EQUAL)
+    if function == BNE:
+        return not flags & EQUAL
+    if function == BLT:
+        return bool(flags & LESS)
+    if function == BGE:
+        return not flags & LESS
+    return False
+
+
+def target(program, pc, offset):
+    """Return the instruction the branch at pc goes to when taken.
+
+    offset is the field as decoded, a two's complement number.
+    """
+    if offset >> (Program.OFFSET_BITS - 1):
+        offset -= 1 << Program.OFFSET_BITS
+    goal = pc + offset
+    if not 0 <= goal <= Program.length(program):
+        raise ValueError(f"Desvio da instrução {pc} para fora do programa: {goal}")
+    return goal
+
+
+def used(program):
+    """Tell whether a decoded program has compare, branch or block-move instructions."""
+    opcodes, functions = program[::Program.RECORD], program[2::Program.RECORD]
+    if getattr(program, 'typecode', 'B') == 'B':
+        # The function bytes of the opcode-7 records, ANDed as one integer
+        return bool(int.from_bytes(bytes(opcodes).translate(_OPCODE_7), 'big')
+                    & int.from_bytes(bytes(functions), 'big'))
+    return any(map(_USED.__contains__, zip(opcodes, functions)))
+
+
+def moves(program):
+    """Tell whether a decoded program has block-move instructions."""
+    return any(opcode == 7 and function == BLOCK_MOVE
+               for opcode, function in zip(program[::Program.RECORD], program[2::Program.RECORD]))
+
+
+class Predictor:
+    """Tables and statistics of a branch predictor.
+
+    kind: 'static' (backward taken, forward not taken) or '2bit';
+    entries: 2-bit counters of '2bit'; btb: entries of the direct-mapped
+    branch-target buffer (0: none); penalty: cycles of a misprediction.
+    """
+
+    def __init__(self, kind='static', entries=16, btb=0, penalty=2):
+        if kind not in PREDICTORS:
+            raise ValueError(f"Preditor desconhecido: {kind}")
+        if entries < 1 or btb < 0 or penalty < 0:
+            raise ValueError("Tamanhos do preditor inválidos")
+        self.kind = kind
+        self.entries = entries
+        self.btb = btb
+        self.penalty = penalty
+        # Weakly not taken
+        self.counters = [1] * entries
+        # Per BTB entry, the (pc, target) of the last taken branch there
+        self.targets = [None] * btb
+        self.stats = {'branches': 0, 'taken': 0, 'mispredictions': 0, 'bubbles': 0, 'penalty_cycles': 0}
+
+    def direction(self, pc, function, goal):
+        """Return whether the branch at pc is predicted taken."""
+        if function == JUMP:
+            return True
+        if self.kind == 'static':
+            return goal <= pc
+        return self.counters[pc % self.entries] >= 2
+
+    def resolve(self, pc, function, goal, went):
+        """Account the branch at pc to goal, taken or not; return the cycles it loses."""
+        predicted = pc + 1
+        bubble = 0
+        if self.direction(pc, function, goal):
+            if not self.btb:
+                predicted = goal
+                bubble = 1
+            elif self.targets[pc % self.btb] == (pc, goal):
+                predicted = goal
+        if function != JUMP:
+            counter = self.counters[pc % self.entries]
+            self.counters[pc % self.entries] = min(counter + 1, 3) if went else max(counter - 1, 0)
+        if went and self.btb:
+            self.targets[pc % self.btb] = (pc, goal)
+
+        self.stats['branches'] += 1
+        self.stats['taken'] += went
+        if predicted != (goal if went else pc + 1):
+            self.stats['mispredictions'] += 1
+            self.stats['penalty_cycles'] += self.penalty
+            return self.penalty
+        self.stats['bubbles'] += bubble
+        return bubble
+
+    def summary(self):
+        """Return the configuration and the statistics as a dict."""
+        branches = self.stats['branches']
+        return dict(self.stats, kind=self.kind, entries=self.entries, btb=self.btb, penalty=self.penalty,
+                    accuracy=(branches - self.stats['mispredictions']) / branches if branches else 0.0)
@@ -1,307 +1,855 @@
-from myhdl import block, Signal, always_comb, Simulation, delay, traceSignals, instance, always,intbv
+from myhdl import block, Signal, ResetSignal, always_comb, Simulation, delay, traceSignals, instance, always,intbv, now, StopSimulation
 from random import randrange
+from array import array
+import argparse
+import time
 
-bits = []
+import Branch
+import Cache
+import Checkpoint
+import ControlUnit
+import Profile
+import Program
+import Trace
 
-with open('bits.txt','r') as file:
-   for linha in file:
-       bits.append(linha.strip())
-       
-print(bits)
+# Simulated time units per clock cycle (clkgen toggles every 10)
+CLOCK_PERIOD = 20
+
+# The register file and the memory are arrays, one compact buffer each,
+# instead of one Signal per word. A write that changes a word toggles the
+# block's 'written' Signal: the read ports and the VCD trace wake on it
+# the way they woke on the Signal of the word.
 
 @block 
-def register(clk, reg_write, regWrite_addr, regRead_addr, write_data, read_data):
-    regs = [Signal(intbv(0)[32:]) for i in range(32)]
+def register(clk, reg_write, regWrite_addr, regRead_addr, write_data, read_data, regs, written,
+             vreg_write, vwrite_data, vread_data, profile=None):
+    # read_data and write_data are as wide as the data path, so read_data
+    # sees the low lane of a register; vector instructions read and write
+    # all 32 bits through vread_data, vwrite_data and vreg_write
+    mask = (1 << len(read_data)) - 1
     
     @always(clk.posedge)
     def write_regs():
         if(reg_write):
-            regs[regWrite_addr].next = write_data
+            if regs[regWrite_addr] != write_data:
+                regs[regWrite_addr] = int(write_data)
+                written.next = not written
+            if profile is not None:
+                profile['registers']['writes'][int(regWrite_addr)] += 1
+        if(vreg_write):
+            if regs[regWrite_addr] != vwrite_data:
+                regs[regWrite_addr] = int(vwrite_data)
+                written.next = not written
+            if profile is not None:
+                profile['registers']['writes'][int(regWrite_addr)] += 1
     
-    @always_comb
+    @instance
     def read_regs():
-        read_data.next = regs[regRead_addr]
+        # A read is counted when the port moves to another register; the
+        # wake-ups from 'written' only refresh the port
+        last = int(regRead_addr)
+        while True:
+            value = regs[regRead_addr]
+            read_data.next = value & mask
+            vread_data.next = value
+            if profile is not None and regRead_addr != last:
+                last = int(regRead_addr)
+                profile['registers']['reads'][last] += 1
+            yield regRead_addr, written
     return write_regs,read_regs
         
 
 @block 
-def memory(clk, addr, data_in, data_out, write_enable):
-    mem_size = 256
-    mem = [Signal(intbv(0)[10:]) for i in range(mem_size)]
+def memory(clk, addr, data_in, data_out, write_enable, mem, written, profile=None):
     
     @always(clk.posedge)
     def write():
         if write_enable:
-            mem[addr].next = data_in
-    @always_comb
+            if mem[addr] != data_in:
+                mem[addr] = int(data_in)
+                written.next = not written
+            if profile is not None:
+                profile['memory']['writes'][int(addr)] += 1
+    @instance
     def read():
-        if write_enable == 0:
-            data_out.next = mem[addr]
+        # A word only changes while write_enable is set, and the read
+        # wakes up again when it falls; 'written' also wakes it for the
+        # writes of other ports sharing mem (MultiCore.py). As in
+        # Cache.accessed(), a read is counted when the port moves to a new
+        # address or reads again after a write
+        last = {'addr': int(addr), 'data': 0, 'write': bool(write_enable)}
+        while True:
+            if write_enable == 0:
+                data_out.next = mem[addr]
+                if profile is not None and Cache.accessed(last, addr, 0, False):
+                    profile['memory']['reads'][int(addr)] += 1
+            if profile is not None:
+                last.update(addr=int(addr), write=bool(write_enable))
+            yield addr, write_enable, written
     return write, read
 
 @block 
-def mux(bit,clk,out,addr):
-    @always(clk.posedge)
+def dma(clk, source, destination, count, mem, written, profile=None):
+    # source, destination: addresses of the next word to copy and its copy
+    # count: words left; UC loads the three to start a block move, then the
+    #        engine copies one word per clock edge straight into mem, next
+    #        to the memory ports, and sleeps again once count is 0
+    
+    @instance
+    def transfer():
+        while True:
+            if count:
+                start, goal, words = int(source), int(destination), int(count)
+                for k in range(words):
+                    yield clk.posedge
+                    value = mem[start + k]
+                    if mem[goal + k] != value:
+                        mem[goal + k] = value
+                        written.next = not written
+                    if profile is not None:
+                        profile['memory']['reads'][start + k] += 1
+                        profile['memory']['writes'][goal + k] += 1
+                    source.next = start + k + 1
+                    destination.next = goal + k + 1
+                    count.next = words - k - 1
+            yield count
+    return transfer
+
+@block 
+def mux(bit,out,addr):
+    # Combinational: with bit and addr held, it never wakes up
+    @always_comb
     def mux_logic():
         out.next=bit[addr]
     return mux_logic
 
+# ALU operations by operation code. They get the num1 and num2 Signals, so
+# ~ keeps the 8-bit width of num1 and / still yields a float
+OPERATIONS = (
+    lambda a, b: a + b,
+    lambda a, b: a - b,
+    lambda a, b: a * b,
+    lambda a, b: a / b,
+    lambda a, b: a ** b,
+    lambda a, b: a % b,
+    lambda a, b: a & b,
+    lambda a, b: a | b,
+    lambda a, b: ~(a & b),
+    lambda a, b: ~(a | b),
+    lambda a, b: a ^ b,
+    lambda a, b: ~(a ^ b),
+    lambda a, b: ~(a),
+)
+
+# Vector operations by operation code minus Program.VECTOR: add, sub, and,
+# or, xor, not and lane insert (shift the lanes of a up by one, put the low
+# lane of b in lane 0). They get the ints of vnum1 and vnum2 and work on all
+# lanes at once; add and sub keep carries and borrows inside each lane, so
+# every lane wraps around on its own
+LANES_LOW = 0x7F7F7F7F
+LANES_HIGH = 0x80808080
+VECTOR_MASK = 0xFFFFFFFF
+VECTOR_OPERATIONS = (
+    lambda a, b: ((a & LANES_LOW) + (b & LANES_LOW)) ^ ((a ^ b) & LANES_HIGH),
+    lambda a, b: ((a | LANES_HIGH) - (b & LANES_LOW)) ^ ((a ^ ~b) & LANES_HIGH),
+    lambda a, b: a & b,
+    lambda a, b: a | b,
+    lambda a, b: a ^ b,
+    lambda a, b: ~a & VECTOR_MASK,
+    lambda a, b: (a << Program.LANE_BITS | b & 0xFF) & VECTOR_MASK,
+)
+
 @block 
-def ALU(operation,num1,num2,result,clk):
+def ALU(operation,num1,num2,result,vnum1,vnum2,vresult,clk,enable,profile=None):
+    # enable: set by the control unit on the edges after it changes an input;
+    #         on any other edge the inputs, and so result, are unchanged, and
+    #         alu_logic sleeps until enable rises instead of waking every edge
+    # vnum1, vnum2, vresult: whole registers for the vector operations
     
     out = Signal(0)
     bit = Signal(intbv(0)[8:])
     addr = Signal(intbv(0)[3:])
 
-    mux_inst = mux(bit, clk, out, addr)
+    mux_inst = mux(bit, out, addr)
     
     
-    @always(clk.posedge)
+    @instance
     def alu_logic():
-        if(operation == 0):
-            result.next = num1 + num2
-        elif(operation == 1):
-            result.next = num1 - num2
-        elif(operation == 2):
-            result.next = num1 * num2
-        elif(operation == 3):
-            result.next = num1 / num2 
-        elif(operation == 4):
-            result.next = num1 ** num2
-        elif(operation == 5):
-            result.next = num1 % num2
-        elif(operation == 6):
-            result.next = num1 & num2
-        elif(operation == 7):
-            result.next = num1 | num2
-        elif(operation == 8):
-            result.next = ~(num1 & num2)
-        elif(operation == 9):
-            result.next = ~(num1 | num2)
-        elif(operation == 10):
-            result.next = num1 ^ num2
-        elif(operation == 11):
-            result.next = ~(num1 ^ num2)
-        elif(operation == 12):
-            result.next = ~(num1)
+        while True:
+            yield clk.posedge
+            if not enable:
+                yield enable.posedge
+                continue
+            if profile is not None:
+                profile['alu'][int(operation)] += 1
+            if operation < len(OPERATIONS):
+                result.next = OPERATIONS[operation](num1, num2)
+            elif 0 <= operation - Program.VECTOR < len(VECTOR_OPERATIONS):
+                vresult.next = VECTOR_OPERATIONS[operation - Program.VECTOR](int(vnum1), int(vnum2))
       
     return alu_logic,mux_inst
 
 @block
-def system():
+def system(program, state=None, trace=None, profile=None, control='uc', cache=None,
+           checkpoint=None, save=None, dump='ports', geometry=None, bus=None, predictor=None):
+    # program: decoded instructions from Program.load() or Program.decode()
+    # state: optional dict that receives the final register and memory contents,
+    #        the number of clock cycles and whether UC halted
+    # trace: optional dict with the 'stream' to write a VCD to and, optionally,
+    #        the 'signals' to record and the 'start'/'stop' cycles (see Trace.py)
+    # profile: optional dict from Profile.new_profile() that receives cycles per
+    #          opcode and instruction, ALU operations and register/memory accesses
+    # control: 'uc' for the UC generator below, 'hardware' for the state machine
+    #          and instruction ROM of ControlUnit.py
+    # cache: optional Cache.Cache placed between UC and memory; its misses
+    #        stall UC and the datapath
+    # checkpoint: optional checkpoint (see Checkpoint.py) to resume from
+    # save: optional dict with the checkpoint 'file' to write when the program
+    #       ends or, when 'at' is given, before instruction 'at' (then UC stops)
+    # dump: 'ports' reads 32 registers and 16 memory words through the datapath
+    #       after the program; 'direct' prints all of them without clock edges
+    # geometry: memory size, register count and word width from
+    #           Program.geometry(); the program must be decoded with it
+    # bus: makes this one core of MultiCore.system(): a dict with the core's
+    #      'clk', driven by the bus arbiter, and the shared 'mem' array and
+    #      its 'written' Signal; system() adds the core's 'addr', 'data_in'
+    #      and 'write_enable' to it, and UC ends without the dump
+    # predictor: Branch.Predictor UC consults for branches (default: static)
     
-    addr = Signal(intbv(0)[8:])
-    data_in = Signal(intbv(0)[8:])
-    data_out = Signal(intbv(0)[8:])
-    write_enable = Signal(bool(0))
-    clk = Signal(bool(0))
+    g = Program.DEFAULT if geometry is None else geometry
+    if control != 'uc' and (checkpoint is not None or save is not None or dump != 'ports'):
+        raise ValueError("Checkpoints e o dump direto só estão disponíveis com a UC")
+    if control != 'uc' and g['fields'] is not Program.FIELDS:
+        raise ValueError("A UC em hardware só está disponível na configuração padrão")
+    if control != 'uc' and Branch.used(program):
+        raise ValueError("Comparações, desvios e cópias em bloco só estão disponíveis com a UC")
+    if bus is not None and Branch.moves(program):
+        raise ValueError("Um núcleo do MultiCore não executa cópias em bloco")
+    if bus is not None and (control != 'uc' or cache is not None or checkpoint is not None
+                            or save is not None or trace is not None):
+        raise ValueError("Um núcleo do MultiCore só roda a UC, sem cache, checkpoints ou trace")
+    if checkpoint is not None and (len(checkpoint['memory']), len(checkpoint['registers']), checkpoint['word_width']) \
+            != (g['memory_size'], g['register_count'], g['word_width']):
+        raise ValueError("O checkpoint foi gravado com outra configuração de memória")
+    init = Checkpoint.initial(checkpoint)
+    width = g['word_width']
+    
+    addr = Signal(intbv(init['addr'], min=0, max=g['memory_size']))
+    data_in = Signal(intbv(init['data_in'])[width:])
+    data_out = Signal(intbv(init['data_out'])[width:])
+    write_enable = Signal(bool(init['write_enable']))
+    clk = Signal(bool(0)) if bus is None else bus['clk']
 
-    operation = Signal(intbv(0)[5:])
-    num1 = Signal(intbv(0)[8:])
-    num2 = Signal(intbv(0)[8:])
-    result = Signal(intbv(0)[14:])
+    operation = Signal(intbv(init['operation'])[Program.OPERATION_BITS:])
+    num1 = Signal(intbv(init['num1'])[width:])
+    num2 = Signal(intbv(init['num2'])[width:])
+    result = Signal(intbv(init['result'])[g['result_bits']:])
+    # Low between instructions, so a checkpoint does not need it
+    alu_enable = Signal(bool(0))
+    
+    reg_write = Signal(init['reg_write'])
+    regWrite_addr = Signal(intbv(init['regWrite_addr'], min=0, max=g['register_count']))
+    regRead_addr = Signal(intbv(init['regRead_addr'], min=0, max=g['register_count']))
+    write_data = Signal(intbv(init['write_data'])[width:])
+    read_data = Signal(intbv(init['read_data'])[width:])
+    
+    aux = Signal(intbv(init['aux'])[width:])
+    aux1 = Signal(intbv(init['aux1'])[width:])
     
-    reg_write = Signal(0)
-    regWrite_addr = Signal(intbv(0)[5:])
-    regRead_addr = Signal(intbv(0)[5:])
-    write_data = Signal(intbv(0)[8:])
-    read_data = Signal(intbv(0)[8:])
+    # Vector path, as wide as a register. Every vector instruction leaves
+    # vreg_write low and sets vwrite_data before writing, so a checkpoint
+    # does not need those two
+    wide = Program.LANES * Program.LANE_BITS
+    vnum1 = Signal(intbv(init['vnum1'])[wide:])
+    vnum2 = Signal(intbv(init['vnum2'])[wide:])
+    vresult = Signal(intbv(init['vresult'])[wide:])
+    vreg_write = Signal(bool(0))
+    vwrite_data = Signal(intbv(0)[wide:])
+    vread_data = Signal(intbv(0)[wide:])
     
-    aux = Signal(intbv(0)[8:])
-    aux1 = Signal(intbv(0)[8:])
+    # Result of the last C.M.P., tested by the branches
+    flags = Signal(intbv(init['flags'])[Branch.FLAG_BITS:])
+    if predictor is None:
+        predictor = Branch.Predictor()
     
-    alu_inst = ALU(operation, num1,num2,result,clk)
-    memory_inst = memory(clk, addr, data_in,data_out, write_enable)
-    register_inst = register(clk, reg_write, regWrite_addr, regRead_addr, write_data, read_data)
+    # Registers of the DMA engine; addresses go one past the last word,
+    # where a block move that ends at the last word leaves them
+    dma_source = Signal(intbv(init['dma_source'], min=0, max=g['memory_size'] + 1))
+    dma_destination = Signal(intbv(init['dma_destination'], min=0, max=g['memory_size'] + 1))
+    dma_count = Signal(intbv(init['dma_count'])[Program.OFFSET_BITS:])
+    
+    # 32-bit registers; memory words as wide as the data path
+    regs = array(Program.WORD, bytes(4 * g['register_count']))
+    mem = array(Program.typecode(width), [0]) * g['memory_size']
+    if checkpoint is not None:
+        regs = array(Program.WORD, checkpoint['registers'])
+        mem = array(Program.typecode(width), checkpoint['memory'])
+    regs_written = Signal(bool(0))
+    mem_written = Signal(bool(0))
+    if bus is not None:
+        mem = bus['mem']
+        mem_written = bus['written']
+        bus.update(addr=addr, data_in=data_in, write_enable=write_enable)
+    
+    datapath = {
+        'addr': addr, 'data_in': data_in, 'data_out': data_out,
+        'write_enable': write_enable, 'operation': operation, 'num1': num1,
+        'num2': num2, 'result': result, 'alu_enable': alu_enable, 'reg_write': reg_write,
+        'regWrite_addr': regWrite_addr, 'regRead_addr': regRead_addr,
+        'write_data': write_data, 'read_data': read_data, 'aux': aux, 'aux1': aux1,
+        'vnum1': vnum1, 'vnum2': vnum2, 'vresult': vresult, 'vreg_write': vreg_write,
+        'vwrite_data': vwrite_data, 'vread_data': vread_data, 'flags': flags,
+        'dma_source': dma_source, 'dma_destination': dma_destination, 'dma_count': dma_count,
+    }
+    # Cycles and instructions already run before the checkpoint
+    start_cycles = checkpoint['cycles'] if checkpoint is not None else 0
+    start_pc = checkpoint['pc'] if checkpoint is not None else 0
+    start_instructions = checkpoint['instructions'] if checkpoint is not None else 0
+    
+    alu_inst = ALU(operation, num1,num2,result,vnum1,vnum2,vresult,clk,alu_enable,profile)
+    memory_inst = memory(clk, addr, data_in,data_out, write_enable, mem, mem_written, profile)
+    register_inst = register(clk, reg_write, regWrite_addr, regRead_addr, write_data, read_data, regs, regs_written,
+                             vreg_write, vwrite_data, vread_data, profile)
+
+    # With a cache, clkgen drives a free running clock and the cache block
+    # derives clk from it, skipping the edges it stalls
+    source = clk if cache is None else Signal(bool(0))
+    # The DMA engine goes straight to memory, so the cache does not stall it
+    dma_inst = dma(source, dma_source, dma_destination, dma_count, mem, mem_written, profile)
 
     @always(delay(10))
     def clkgen():
-        clk.next = not clk
+        source.next = not source
 
-    @instance  
-    def UC():
-        for linha in bits:
-            if len(linha) < 32:
-                raise ValueError("Todas as intruções tem que ter no mínimo 32 bits")
-        while(len(bits) > 0):            
+    def cycle():
+        return start_cycles + (now() + CLOCK_PERIOD // 2) // CLOCK_PERIOD
+    
+    def control():
+        pc = start_pc
+        executed = start_instructions
+        # Cycle of the last word of the running block move; UC does not
+        # touch memory before it
+        moved = cycle() + int(dma_count)
+        while(pc < Program.length(program)):
+            if save is not None and pc == save.get('at'):
+                # Half a cycle later every write of the last edge has landed
+                if now() > 0:
+                    yield clk.negedge
+                Checkpoint.save(save['file'], Checkpoint.capture(pc, cycle(), datapath, regs, mem, executed))
+                if state is not None:
+                    state['cycles'] = cycle()
+                    state['checkpoint'] = pc
+                raise StopSimulation("UC gravou o checkpoint")
+            opcode, f0, f1, f2, f3 = Program.instruction(program, pc)
+            first = (now() + CLOCK_PERIOD // 2) // CLOCK_PERIOD
+            following = pc + 1
+            
+            # Other instructions run while the DMA engine copies
+            if opcode in (0, 3, 5, 6) or (opcode == 7 and f1 == Branch.BLOCK_MOVE):
+                while cycle() < moved:
+                    yield clk.posedge
             
             #Write in Memory
-            if(int(bits[0][0:3],2) == 0):
+            if(opcode == 0):
                 yield clk.posedge
                 write_enable.next = True
-                addr.next = intbv(int(bits[0][4:11],2))
+                addr.next = f0
                 yield clk.posedge
-                data_in.next = intbv(int(bits[0][12:19],2))     
+                data_in.next = f1     
            
             #Write in Registers
-            if(int(bits[0][0:3],2) == 1):
+            if(opcode == 1):
                 yield clk.posedge
                 reg_write.next = True
-                regWrite_addr.next = intbv(int(bits[0][4:8],2))
+                regWrite_addr.next = f0
                 yield clk.posedge
-                write_data.next = intbv(int(bits[0][9:16],2))        
+                write_data.next = f1        
             
             #Do Func
-            if(int(bits[0][0:3],2) == 2):
+            if(opcode == 2):
+                # Vector operations take whole registers through the vector path
+                vector = f2 >= Program.VECTOR
       
                 yield clk.posedge
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][4:8], 2)) 
+                regRead_addr.next = f0 
                 yield clk.posedge  
-                num1.next = read_data
-                yield clk.posedge
-                regRead_addr.next = intbv(int(bits[0][14:18], 2))  
+                if vector:
+                    vnum1.next = vread_data
+                else:
+                    num1.next = read_data
+                alu_enable.next = True
+                yield clk.posedge
+                regRead_addr.next = f1  
+                alu_enable.next = False
                 yield clk.posedge  
-                num2.next = read_data
+                if vector:
+                    vnum2.next = vread_data
+                else:
+                    num2.next = read_data
+                alu_enable.next = True
                 yield clk.posedge
-                operation.next = intbv(int(bits[0][9:13], 2))
+                operation.next = f2
                 yield clk.posedge 
-                reg_write.next = True
-                regWrite_addr.next = intbv(int(bits[0][19:23], 2)) 
+                reg_write.next = not vector
+                regWrite_addr.next = f3 
+                alu_enable.next = False
                 yield clk.posedge 
-                write_data.next = result
+                if vector:
+                    # One edge of the wide write port, then it is released
+                    vwrite_data.next = vresult
+                    vreg_write.next = True
+                    yield clk.posedge
+                    vreg_write.next = False
+                else:
+                    write_data.next = result
                 
             #Move in memory
-            if(int(bits[0][0:3],2) == 3):
+            if(opcode == 3):
                 
                 yield clk.posedge 
                 write_enable.next = False
-                addr.next = intbv(int(bits[0][9:13],2))
+                addr.next = f1
                 yield clk.posedge
                 aux1.next = data_out
                 yield clk.posedge 
                 write_enable.next = False
-                addr.next = intbv(int(bits[0][4:8],2))
+                addr.next = f0
                 yield clk.posedge
                 aux.next = data_out
                 yield clk.posedge
-                addr.next = intbv(int(bits[0][9:13],2))
+                addr.next = f1
                 write_enable.next = True
                 data_in.next = aux
                 yield clk.posedge
                 write_enable.next = False
-                addr.next = intbv(int(bits[0][14:18],2))
+                addr.next = f2
                 yield clk.posedge
                 aux.next = data_out
                 yield clk.posedge
-                addr.next = intbv(int(bits[0][4:8],2))
+                addr.next = f0
                 write_enable.next = True
                 data_in.next = aux
                 yield clk.posedge
                 write_enable.next = False
-                addr.next = intbv(int(bits[0][9:13],2))
+                addr.next = f1
                 yield clk.posedge
                 aux.next = data_out
                 yield clk.posedge
-                addr.next = intbv(int(bits[0][14:18],2))
+                addr.next = f2
                 write_enable.next = True
                 data_in.next = aux
                 yield clk.posedge
-                addr.next = intbv(int(bits[0][9:13],2))
+                addr.next = f1
                 write_enable.next = True
                 data_in.next = aux1
             
             #Move in registers
-            if(int(bits[0][0:3],2) == 4):
+            if(opcode == 4):
                 
                 yield clk.posedge 
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][9:13],2))
+                regRead_addr.next = f1
                 yield clk.posedge
                 aux1.next = read_data
                 yield clk.posedge 
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][4:8],2))
+                regRead_addr.next = f0
                 yield clk.posedge
                 aux.next = read_data
                 yield clk.posedge
-                regWrite_addr.next = intbv(int(bits[0][9:13],2))
+                regWrite_addr.next = f1
                 reg_write.next = True
                 write_data.next = aux
                 yield clk.posedge
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][14:18],2))
+                regRead_addr.next = f2
                 yield clk.posedge
                 aux.next = read_data
                 yield clk.posedge
-                regWrite_addr.next = intbv(int(bits[0][4:8],2))
+                regWrite_addr.next = f0
                 reg_write.next = True
                 write_data.next = aux
                 yield clk.posedge
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][9:13],2))
+                regRead_addr.next = f1
                 yield clk.posedge
                 aux.next = read_data
                 yield clk.posedge
-                regWrite_addr.next = intbv(int(bits[0][14:18],2))
+                regWrite_addr.next = f2
                 reg_write.next = True
                 write_data.next = aux
                 yield clk.posedge
-                regWrite_addr.next = intbv(int(bits[0][9:13],2))
+                regWrite_addr.next = f1
                 reg_write.next = True
                 write_data.next = aux1
                 
             #Move Registers to Memory
-            if(int(bits[0][0:3],2) == 5):
+            if(opcode == 5):
         
                 yield clk.posedge
                 reg_write.next = False
-                regRead_addr.next = intbv(int(bits[0][4:8],2))
+                regRead_addr.next = f0
                 yield clk.posedge
                 write_enable.next = True
-                addr.next = intbv(int(bits[0][9:16],2))
+                addr.next = f1
                 yield clk.posedge
                 data_in.next = read_data
             
             #Move Memory to Register
-            if(int(bits[0][0:3],2) == 6):
+            if(opcode == 6):
                 
                 yield clk.posedge
                 write_enable.next = False
-                addr.next = intbv(int(bits[0][4:11],2))
+                addr.next = f0
                 yield clk.posedge
                 reg_write.next = True
-                regWrite_addr.next = intbv(int(bits[0][12:16],2))
+                regWrite_addr.next = f1
                 yield clk.posedge
                 write_data.next = data_out
             
             #Remove Register
-            if(int(bits[0][0:3],2) == 7):
+            if(opcode == 7 and f1 == Branch.CLEAR):
                 
                 yield clk.posedge
                 reg_write.next = True
-                regWrite_addr.next = intbv(int(bits[0][4:8],2))
+                regWrite_addr.next = f0
                 yield clk.posedge
                 write_data.next = 0
+            
+            #Compare Registers
+            if(opcode == 7 and f1 == Branch.COMPARE):
+                
+                yield clk.posedge
+                reg_write.next = False
+                regRead_addr.next = f0
+                yield clk.posedge
+                aux.next = read_data
+                regRead_addr.next = f2
+                yield clk.posedge
+                flags.next = Branch.compare(aux, read_data)
+            
+            #Jump and Branches
+            if(opcode == 7 and Branch.JUMP <= f1 <= Branch.BGE):
+                
+                goal = Branch.target(program, pc, f3)
+                went = Branch.taken(f1, flags)
+                yield clk.posedge
+                # Edges lost to a misprediction or to the target bubble
+                for i in range(predictor.resolve(pc, f1, goal, went)):
+                    yield clk.posedge
+                if went:
+                    following = goal
+            
+            #Block Move
+            if(opcode == 7 and f1 == Branch.BLOCK_MOVE):
+                
+                yield clk.posedge
+                write_enable.next = False
+                reg_write.next = False
+                regRead_addr.next = f0
+                yield clk.posedge
+                dma_source.next = vread_data
+                regRead_addr.next = f2
+                yield clk.posedge
+                if max(int(dma_source), int(vread_data)) + f3 > g['memory_size']:
+                    raise ValueError(f"Cópia em bloco da instrução {pc} para fora da memória")
+                dma_destination.next = vread_data
+                dma_count.next = f3
+                # The engine copies on the next f3 edges
+                moved = cycle() + f3
                                
-            del(bits[0])
+            index, pc = pc, following
+            executed += 1
+            yield clk.posedge
+            if profile is not None:
+                Profile.record(profile, index, opcode, (now() + CLOCK_PERIOD // 2) // CLOCK_PERIOD - first, f1)
+        while cycle() < moved:
             yield clk.posedge
+        program_cycles = cycle()
+        if bus is not None:
+            # The memory is shared: MultiCore.py stops the run once every
+            # core is done and reads it then
+            if now() > 0:
+                yield clk.negedge
+            if state is not None:
+                state['registers'] = regs.tolist()
+                state['cycles'] = program_cycles
+                state['program_cycles'] = program_cycles
+                state['instructions'] = executed
+                state['halted'] = True
+            return
+        if save is not None or dump == 'direct':
+            if now() > 0:
+                yield clk.negedge
+            final = Checkpoint.capture(pc, program_cycles, datapath, regs, mem, executed)
+            if save is not None:
+                Checkpoint.save(save['file'], final)
+            if dump == 'direct':
+                print(Checkpoint.dump_text(final), end="")
+                if state is not None:
+                    state['registers'] = final['registers']
+                    state['memory'] = final['memory']
+                    state['cycles'] = program_cycles
+                    state['program_cycles'] = program_cycles
+                    state['instructions'] = executed
+                    state['halted'] = True
+                raise StopSimulation("UC terminou o programa")
         yield clk.posedge
         
         write_enable.next = False
         reg_write.next = False
         
         print("\nConteúdo dos Registradores:")
-        for i in range(32):  
+        for i in range(min(32, g['register_count'])):  
             regRead_addr.next = i
             yield clk.posedge  
             print(f"Registrador {i:04b}: {read_data}")
         
         print("\nConteúdo da Memória:")
-        for i in range(16):  
+        for i in range(min(16, g['memory_size'])):  
             addr.next = i
             yield clk.posedge  
             print(f"Endereço {i:04b}: {data_out}")
+        
+        if state is not None:
+            state['registers'] = regs.tolist()
+            state['memory'] = mem.tolist()
+            state['cycles'] = cycle()
+            state['program_cycles'] = program_cycles
+            state['instructions'] = executed
+            state['halted'] = True
+        
+        # Nothing is left to do once the state has been dumped
+        raise StopSimulation("UC terminou o programa")
+    
+    @instance
+    def UC():
+        steps = control()
+        if profile is not None:
+            # Time spent running UC's own Python code, between its yields
+            steps = Profile.timed(steps, profile['seconds'], 'uc')
+        yield from steps
+    
+    # A core of MultiCore.py gets its clock from the bus arbiter
+    instances = [clkgen] if bus is None else []
+    instances += [memory_inst, dma_inst, alu_inst, register_inst]
+    if cache is not None:
+        instances.append(Cache.cache(source, clk, addr, data_in, write_enable, cache))
+    if control == 'hardware':
+        reset = ResetSignal(0, active=1, isasync=False)
+        words = ControlUnit.program_words(program)
+        pc, phase, step, index, opcode = ControlUnit.state_signals(words)
+        controller_inst = ControlUnit.controller(clk, reset, words, pc, phase, step, index, opcode,
+                                                 write_enable, addr, data_in, data_out, operation, num1, num2, result, alu_enable,
+                                                 reg_write, regWrite_addr, regRead_addr, write_data, read_data, aux, aux1,
+                                                 vnum1, vnum2, vresult, vreg_write, vwrite_data, vread_data)
+        done = {}
+        
+        # Testbench side of the hardware control unit: prints the dump and
+        # stops the simulation on the same edges as UC
+        @always(clk.posedge)
+        def monitor():
+            if phase == ControlUnit.t_phase.FETCH and profile is not None:
+                Profile.record(profile, int(pc), int(opcode), int(step) + 1)
+            elif phase == ControlUnit.t_phase.EXECUTE and pc == len(words):
+                done['program_cycles'] = (now() + CLOCK_PERIOD // 2) // CLOCK_PERIOD - 1
+                print("\nConteúdo dos Registradores:")
+            elif phase == ControlUnit.t_phase.DUMP_REGS:
+                print(f"Registrador {int(index):04b}: {read_data}")
+                if index == ControlUnit.DUMP_REGISTERS - 1:
+                    print("\nConteúdo da Memória:")
+            elif phase == ControlUnit.t_phase.DUMP_MEM:
+                print(f"Endereço {int(index):04b}: {data_out}")
+                if index == ControlUnit.DUMP_MEMORY - 1:
+                    if state is not None:
+                        state['registers'] = regs.tolist()
+                        state['memory'] = mem.tolist()
+                        state['cycles'] = (now() + CLOCK_PERIOD // 2) // CLOCK_PERIOD
+                        state['program_cycles'] = done['program_cycles']
+                        state['instructions'] = len(words)
+                        state['halted'] = True
+                    raise StopSimulation("UC em hardware terminou o programa")
+        
+        instances += [controller_inst, monitor]
+    else:
+        instances.append(UC)
+    
+    if trace is not None:
+        signals = dict(datapath, clk=clk)
+        signals.update((f'regs[{i}]', Trace.Word(regs, i, 32, regs_written)) for i in range(len(regs)))
+        signals.update((f'mem[{i}]', Trace.Word(mem, i, width, mem_written)) for i in range(len(mem)))
+        signals = Trace.select(signals, trace.get('signals'))
+        instances.append(Trace.vcd(clk, signals, trace['stream'], CLOCK_PERIOD,
+                                   trace.get('start', 0), trace.get('stop')))
             
-    return clkgen, UC, memory_inst, alu_inst, register_inst
+    return instances
+
+def simulate(program, max_cycles=None, trace=None, profile=None, control='uc', cache=None,
+             checkpoint=None, save=None, dump='ports', geometry=None, predictor=None):
+    """Run a program until UC halts or max_cycles clock cycles have elapsed.
+
+    trace is None (no tracing) or a dict with the VCD 'file' name and the
+    optional 'signals', 'start' and 'stop' filters accepted by system().
+    profile is None or a dict from Profile.new_profile() to fill.
+    control selects the control unit and cache a Cache.Cache, as in system().
+    checkpoint, save and dump restore, save and dump the machine state, as
+    in system(); a run stopped by save['at'] reports the 'checkpoint' pc.
+    geometry is None (the default machine) or a dict from Program.geometry().
+    predictor is None (static prediction) or a Branch.Predictor.
+
+    Returns a dict with the final registers and memory (when UC halted),
+    the number of cycles, the wall time in seconds and whether UC halted.
+    """
+    state = {'halted': False}
+    if predictor is None:
+        predictor = Branch.Predictor()
+    stream = None
+    if trace is not None:
+        stream = Trace.open_stream(trace['file'])
+        trace = dict(trace, stream=stream)
+    try:
+        tb = system(program, state, trace, profile, control, cache, checkpoint, save, dump, geometry,
+                    predictor=predictor)
+        start = time.perf_counter()
+        try:
+            if max_cycles is None:
+                tb.run_sim(quiet=1)
+            else:
+                tb.run_sim(max_cycles * CLOCK_PERIOD, quiet=1)
+        finally:
+            state['seconds'] = time.perf_counter() - start
+            tb.quit_sim()
+    finally:
+        if stream is not None:
+            stream.close()
+    if 'cycles' not in state:
+        state['cycles'] = max_cycles
+    if profile is not None:
+        Profile.finish(profile, state['seconds'], state['cycles'])
+    if cache is not None:
+        state['cache'] = cache.summary()
+    if predictor.stats['branches']:
+        state['branches'] = predictor.summary()
+    return state
+
+def report(state):
+    """Print the cycle count, wall time and simulation speed of a run."""
+    cycles = state['cycles']
+    seconds = state['seconds']
+    speed = cycles / seconds if seconds > 0 else float('inf')
+    if 'checkpoint' in state:
+        print(f"Checkpoint gravado antes da instrução {state['checkpoint']}")
+    elif not state['halted']:
+        print(f"Limite de {cycles} ciclos atingido antes do fim do programa")
+    print(f"Ciclos: {cycles}")
+    print(f"Tempo: {seconds:.3f} s")
+    print(f"Ciclos/s: {speed:.0f}")
+    if state.get('instructions'):
+        print(f"CPI: {state['program_cycles'] / state['instructions']:.2f}")
+    if 'cache' in state:
+        c = state['cache']
+        print(f"Cache: {c['size']} palavras, linha {c['line']}, {c['ways']} via(s), {c['policy']}")
+        print(f"  Acessos: {c['accesses']} ({c['reads']} leituras, {c['writes']} escritas)")
+        print(f"  Taxa de acerto: {100 * c['hit_rate']:.1f}%")
+        print(f"  Faltas: {c['misses']} ({c['read_misses']} leitura, {c['write_misses']} escrita), "
+              f"write-backs: {c['writebacks']}")
+        print(f"  Ciclos de parada: {c['stall_cycles']}")
+    if 'branches' in state:
+        b = state['branches']
+        btb = f", BTB de {b['btb']} entradas" if b['btb'] else ", sem BTB"
+        print(f"Desvios: {b['branches']} ({b['taken']} tomados), preditor {b['kind']}{btb}")
+        print(f"  Acerto da predição: {100 * b['accuracy']:.1f}% ({b['mispredictions']} erros)")
+        print(f"  Ciclos de penalidade: {b['penalty_cycles']} de erros, {b['bubbles']} de bolhas")
 
 if __name__ == "__main__":
-    # Cria os arquivos para simular no gtkwave
-    tb = system()
-    tb.config_sim(trace=True)
+    parser = argparse.ArgumentParser(description="Simula o processador Maua-V.")
+    parser.add_argument("file", nargs="?", default="bits.txt", help="arquivo do programa (padrão: bits.txt)")
+    parser.add_argument("--max-cycles", type=int, default=None, help="número máximo de ciclos de clock")
+    parser.add_argument("--trace", metavar="VCD", help="grava um VCD para o gtkwave (.vcd ou .vcd.gz)")
+    parser.add_argument("--trace-signals", default=None,
+                        help="sinais ou grupos a gravar, separados por vírgula: " + ", ".join(Trace.GROUPS))
+    parser.add_argument("--trace-start", type=int, default=0, help="primeiro ciclo gravado")
+    parser.add_argument("--trace-stop", type=int, default=None, help="ciclo em que a gravação termina")
+    parser.add_argument("--pipeline", action="store_true", help="usa a UC em pipeline (Pipeline.py)")
+    parser.add_argument("--hardware-uc", action="store_true",
+                        help="usa a UC em hardware com ROM de instruções (ControlUnit.py)")
+    parser.add_argument("--cache", action="store_true", help="coloca uma cache de dados entre a UC e a memória")
+    parser.add_argument("--cache-size", type=int, default=32, help="palavras na cache")
+    parser.add_argument("--cache-line", type=int, default=4, help="palavras por linha")
+    parser.add_argument("--cache-ways", type=int, default=1, help="vias por conjunto (1: mapeamento direto)")
+    parser.add_argument("--cache-policy", choices=Cache.POLICIES, default="write-back", help="política de escrita")
+    parser.add_argument("--cache-hit", type=int, default=1, help="ciclos de um acerto")
+    parser.add_argument("--cache-miss", type=int, default=10, help="ciclos de cada acesso à memória")
+    parser.add_argument("--predictor", choices=Branch.PREDICTORS, default="static",
+                        help="preditor de desvios: estático ou contadores de 2 bits")
+    parser.add_argument("--predictor-entries", type=int, default=16, help="contadores do preditor de 2 bits")
+    parser.add_argument("--btb", type=int, default=0, help="entradas do buffer de alvos de desvio (0: sem BTB)")
+    parser.add_argument("--mispredict-penalty", type=int, default=2, help="ciclos perdidos em cada erro de predição")
+    parser.add_argument("--checkpoint", metavar="ARQUIVO", help="grava o estado da máquina ao fim do programa")
+    parser.add_argument("--checkpoint-at", type=int, default=None, metavar="N",
+                        help="grava o checkpoint antes da instrução N e para a simulação")
+    parser.add_argument("--restore", metavar="ARQUIVO", help="retoma a simulação de um checkpoint")
+    parser.add_argument("--direct-dump", action="store_true",
+                        help="mostra todos os registradores e palavras de memória sem gastar ciclos")
+    parser.add_argument("--memory-size", type=int, default=Program.MEMORY_SIZE, help="palavras de memória")
+    parser.add_argument("--registers", type=int, default=Program.REGISTER_COUNT, help="número de registradores")
+    parser.add_argument("--word-width", type=int, default=Program.WORD_WIDTH, help="bits por palavra de dados")
+    args = parser.parse_args()
+    if args.checkpoint_at is not None and not args.checkpoint:
+        parser.error("--checkpoint-at precisa de --checkpoint")
+    if args.pipeline:
+        # Pipeline.simulate() runs the bare datapath and its own control unit
+        predictor_options = any(getattr(args, name) != parser.get_default(name)
+                                for name in ('predictor', 'predictor_entries', 'btb', 'mispredict_penalty'))
+        for option, given in (("--trace", args.trace), ("--cache", args.cache),
+                              ("--checkpoint", args.checkpoint), ("--restore", args.restore),
+                              ("--direct-dump", args.direct_dump), ("--hardware-uc", args.hardware_uc),
+                              ("--predictor", predictor_options)):
+            if given:
+                parser.error(f"{option} não está disponível com --pipeline")
+    try:
+        geometry = Program.geometry(args.memory_size, args.registers, args.word_width)
+        predictor = Branch.Predictor(args.predictor, args.predictor_entries, args.btb, args.mispredict_penalty)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.pipeline and geometry['fields'] is not Program.FIELDS:
+        parser.error("--pipeline só está disponível na configuração padrão")
+    if args.hardware_uc and geometry['fields'] is not Program.FIELDS:
+        parser.error("--hardware-uc só está disponível na configuração padrão")
+    if args.hardware_uc and (args.checkpoint or args.restore or args.direct_dump):
+        parser.error("--checkpoint, --restore e --direct-dump só estão disponíveis com a UC")
+    if args.trace:
+        try:
+            Trace.select(Trace.names(geometry['register_count'], geometry['memory_size']), args.trace_signals)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    program = Program.load(args.file, geometry)
+    if (args.hardware_uc or args.pipeline) and Branch.used(program):
+        parser.error("Comparações, desvios e cópias em bloco só estão disponíveis com a UC")
+    
+    trace = None
+    if args.trace:
+        # Cria os arquivos para simular no gtkwave
+        trace = {'file': args.trace, 'signals': args.trace_signals,
+                 'start': args.trace_start, 'stop': args.trace_stop}
     print("Iniciou a simulação")
     try:
-        tb.run_sim(5000)
+        if args.pipeline:
+            import Pipeline
+            state = Pipeline.simulate(program, args.max_cycles)
+        else:
+            control = 'hardware' if args.hardware_uc else 'uc'
+            cache = None
+            if args.cache:
+                cache = Cache.Cache(args.cache_size, args.cache_line, args.cache_ways, args.cache_policy,
+                                    args.cache_hit, args.cache_miss)
+            checkpoint = Checkpoint.load(args.restore) if args.restore else None
+            save = {'file': args.checkpoint, 'at': args.checkpoint_at} if args.checkpoint else None
+            dump = 'direct' if args.direct_dump else 'ports'
+            state = simulate(program, args.max_cycles, trace, control=control, cache=cache,
+                             checkpoint=checkpoint, save=save, dump=dump, geometry=geometry, predictor=predictor)
     finally:
         print("Terminou a simulação")
-        tb.quit_sim()
\ No newline at end of file
+    report(state)
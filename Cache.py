@@ -0,0 +1,132 @@
+"""Data cache timing model between the control unit and memory.
+
+The ``memory`` block answers every access in one cycle. With a cache, each
+access the control unit makes is looked up in a configurable cache
+(direct-mapped or N-way set-associative with LRU replacement, any line
+size, write-back with write-allocate or write-through without it) and
+takes as many cycles as that costs. The extra cycles are stall cycles:
+the ``cache`` block holds the clock of UC and the datapath while the free
+running clock keeps counting.
+
+The cache only models timing; the words themselves stay in ``mem``, so the
+final state of a program does not depend on the cache.
+
+Accesses are seen on the memory port, by the rule of ``accessed()``. UC
+leaves ``write_enable`` set through the instructions that follow a write,
+so an edge with it set is only a new write when it has just risen or when
+the port has moved to a new address or word.
+"""
+
+from myhdl import block, always
+
+POLICIES = ('write-back', 'write-through')
+
+
+def accessed(last, addr, data_in, write_enable):
+    """Return whether the memory port makes a new access on this edge.
+
+    last holds the 'addr', 'data' and 'write' of the port on the last edge.
+    A write is new when write_enable rises or the address or word changes;
+    a read, when the port moves to a new address or reads again the address
+    just written.
+    """
+    if write_enable:
+        return not last['write'] or addr != last['addr'] or data_in != last['data']
+    return addr != last['addr'] or last['write']
+
+
+class Cache:
+    """Tags, dirty bits and statistics of a data cache.
+
+    size: words in the cache; line: words per line; ways: lines per set
+    (1 is direct-mapped); hit_latency and miss_latency: cycles of an access
+    that hits, and of each transfer to or from memory.
+    """
+
+    def __init__(self, size=32, line=4, ways=1, policy='write-back', hit_latency=1, miss_latency=10):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de escrita desconhecida: {policy}")
+        if size <= 0 or line <= 0 or ways <= 0 or size % (line * ways):
+            raise ValueError("O tamanho da cache deve ser múltiplo de linha x vias")
+        if hit_latency < 1 or miss_latency < 0:
+            raise ValueError("Latências inválidas")
+        self.size = size
+        self.line = line
+        self.ways = ways
+        self.policy = policy
+        self.hit_latency = hit_latency
+        self.miss_latency = miss_latency
+        self.set_count = size // (line * ways)
+        # Per set, [tag, dirty] pairs from most to least recently used
+        self.sets = [[] for i in range(self.set_count)]
+        self.stats = {'reads': 0, 'writes': 0, 'read_misses': 0, 'write_misses': 0,
+                      'writebacks': 0, 'stall_cycles': 0}
+
+    def access(self, address, write):
+        """Look up one access and return the stall cycles it costs."""
+        block = address // self.line
+        lines = self.sets[block % self.set_count]
+        tag = block // self.set_count
+        self.stats['writes' if write else 'reads'] += 1
+
+        entry = next((entry for entry in lines if entry[0] == tag), None)
+        latency = self.hit_latency
+        if entry is not None:
+            lines.remove(entry)
+            lines.insert(0, entry)
+        else:
+            self.stats['write_misses' if write else 'read_misses'] += 1
+            if not write or self.policy == 'write-back':
+                latency += self.miss_latency
+                if len(lines) == self.ways:
+                    victim = lines.pop()
+                    if victim[1]:
+                        self.stats['writebacks'] += 1
+                        latency += self.miss_latency
+                entry = [tag, False]
+                lines.insert(0, entry)
+        if write:
+            if self.policy == 'write-through':
+                latency = max(latency, self.miss_latency)
+            else:
+                entry[1] = True
+
+        stall = latency - 1
+        self.stats['stall_cycles'] += stall
+        return stall
+
+    def summary(self):
+        """Return the configuration and the statistics as a dict."""
+        accesses = self.stats['reads'] + self.stats['writes']
+        misses = self.stats['read_misses'] + self.stats['write_misses']
+        return dict(self.stats, size=self.size, line=self.line, ways=self.ways, policy=self.policy,
+                    accesses=accesses, misses=misses,
+                    hit_rate=(accesses - misses) / accesses if accesses else 0.0)
+
+
+@block
+def cache(source, clk, addr, data_in, write_enable, model):
+    # source: free running clock from clkgen
+    # clk: clock of UC and the datapath, held low while the cache stalls
+    # model: Cache instance holding the tags and the statistics
+
+    pending = {'stall': 0}
+    last = {'addr': 0, 'data': 0, 'write': False}
+
+    @always(source)
+    def gate():
+        if source:
+            if pending['stall']:
+                pending['stall'] -= 1
+            else:
+                clk.next = True
+        else:
+            clk.next = False
+
+    @always(clk.posedge)
+    def lookup():
+        if accessed(last, addr, data_in, write_enable):
+            pending['stall'] = model.access(int(addr), bool(write_enable))
+        last.update(addr=int(addr), data=int(data_in), write=bool(write_enable))
+
+    return gate, lookup
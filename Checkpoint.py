@@ -0,0 +1,126 @@
+"""Checkpoints of the Maua-V machine state.
+
+A checkpoint holds everything ``CPU.system()`` needs to resume a program
+at an instruction boundary: the program counter, the cycles spent so far,
+the instructions executed, the datapath Signals UC leaves behind
+(``write_enable`` left high keeps writing, the ALU keeps its last result,
+the flags of the last comparison, ...), the registers of the DMA engine,
+which may be halfway through a block move, every register and every
+memory word. UC takes it between two clock edges, so saving and restoring
+do not add simulated cycles. The branch predictor is not saved: it starts
+cold after a restore.
+
+The file is a 24-byte header (magic ``MAUK``, format version, program
+counter, cycles; little-endian), the memory size, register count and word
+width as uint32 and the instructions executed as uint64, followed by the
+Signals as uint32, the memory words as uint16 and the registers as uint32.
+"""
+
+import struct
+import sys
+from array import array
+
+# Datapath Signals of CPU.system() saved in a checkpoint, in file order.
+SIGNALS = ('addr', 'data_in', 'data_out', 'write_enable', 'operation', 'num1', 'num2', 'result',
+           'reg_write', 'regWrite_addr', 'regRead_addr', 'write_data', 'read_data', 'aux', 'aux1',
+           'vnum1', 'vnum2', 'vresult', 'flags', 'dma_source', 'dma_destination', 'dma_count')
+
+MAGIC = b'MAUK'
+VERSION = 1
+HEADER = struct.Struct('<4sIIQ')
+GEOMETRY = struct.Struct('<III')
+COUNT = struct.Struct('<Q')
+
+WORD = 'I' if array('I').itemsize == 4 else 'L'
+
+
+def capture(pc, cycles, signals, regs, mem, instructions):
+    """Return a checkpoint of the current values of the given Signals."""
+    return {
+        'pc': pc,
+        'cycles': cycles,
+        'instructions': instructions,
+        'signals': {name: int(signals[name]) for name in SIGNALS},
+        'registers': [int(r) for r in regs],
+        'memory': [int(m) for m in mem],
+        'word_width': len(signals['data_in']),
+    }
+
+
+def initial(checkpoint):
+    """Return the initial value of every datapath Signal: restored, or zero."""
+    if checkpoint is None:
+        return dict.fromkeys(SIGNALS, 0)
+    return dict(checkpoint['signals'])
+
+
+def _pack(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tolist()
+
+
+def save(filename, checkpoint):
+    """Write a checkpoint to a file."""
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, checkpoint['pc'], checkpoint['cycles']))
+        file.write(GEOMETRY.pack(len(checkpoint['memory']), len(checkpoint['registers']), checkpoint['word_width']))
+        file.write(COUNT.pack(checkpoint['instructions']))
+        file.write(_pack(WORD, [checkpoint['signals'][name] for name in SIGNALS]))
+        file.write(_pack('H', checkpoint['memory']))
+        file.write(_pack(WORD, checkpoint['registers']))
+
+
+def load(filename):
+    """Read a checkpoint file."""
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{filename}: checkpoint sem cabeçalho")
+    magic, version, pc, cycles = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{filename}: não é um checkpoint Maua-V")
+    if version != VERSION:
+        raise ValueError(f"{filename}: versão {version} do checkpoint não suportada")
+    start = HEADER.size
+    if len(data) < start + GEOMETRY.size + COUNT.size:
+        raise ValueError(f"{filename}: checkpoint truncado")
+    memory_size, register_count, word_width = GEOMETRY.unpack_from(data, start)
+    start += GEOMETRY.size
+    instructions, = COUNT.unpack_from(data, start)
+    start += COUNT.size
+    sizes = (array(WORD).itemsize * len(SIGNALS), 2 * memory_size, 4 * register_count)
+    if len(data) != start + sum(sizes):
+        raise ValueError(f"{filename}: checkpoint truncado")
+    signals = dict(zip(SIGNALS, _unpack(WORD, data[start:start + sizes[0]])))
+    start += sizes[0]
+    memory = _unpack('H', data[start:start + sizes[1]])
+    start += sizes[1]
+    registers = _unpack(WORD, data[start:])
+    return {
+        'pc': pc,
+        'cycles': cycles,
+        'instructions': instructions,
+        'signals': signals,
+        'registers': registers,
+        'memory': memory,
+        'word_width': word_width,
+    }
+
+
+def dump_text(checkpoint):
+    """Format every register and memory word of a checkpoint like the UC dump."""
+    lines = ["\nConteúdo dos Registradores:"]
+    lines.extend(f"Registrador {i:04b}: {value:02x}" for i, value in enumerate(checkpoint['registers']))
+    lines.append("\nConteúdo da Memória:")
+    lines.extend(f"Endereço {i:04b}: {value:02x}" for i, value in enumerate(checkpoint['memory']))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,83 @@
+"""Client of the Maua-V simulation server (Server.py).
+
+Sends program files to a running server on one connection and collects the
+answers, in the order of the files. Results are printed as a summary and,
+with ``-o``, written like Batch.py does.
+"""
+
+import argparse
+import json
+import socket
+import sys
+import time
+
+import Batch
+import Program
+
+
+def connect(path=None, port=None):
+    """Open a connection to the server's Unix socket or localhost port."""
+    if port is not None:
+        return socket.create_connection(('127.0.0.1', port))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    return sock
+
+
+def simulate(programs, path=None, port=None, engine='myhdl', timeout=None, max_cycles=None):
+    """Run program files on the server; return their records in the same order."""
+    with connect(path, port) as sock:
+        for ident, filename in enumerate(programs):
+            request = {'id': ident, 'name': filename, 'words': list(Program.read_words(filename)),
+                       'engine': engine, 'timeout': timeout, 'max_cycles': max_cycles}
+            sock.sendall((json.dumps(request) + '\n').encode())
+        sock.shutdown(socket.SHUT_WR)
+
+        records = [None] * len(programs)
+        with sock.makefile('r') as answers:
+            for linha in answers:
+                record = json.loads(linha)
+                if record.get('id') is None:
+                    raise RuntimeError(record.get('error'))
+                records[record.pop('id')] = record
+    missing = [programs[i] for i, record in enumerate(records) if record is None]
+    if missing:
+        raise RuntimeError(f"sem resposta para {', '.join(missing)}")
+    return records
+
+
+def main():
+    """Send the program files given on the command line to the server."""
+    parser = argparse.ArgumentParser(description="Envia programas Maua-V ao servidor de simulação.")
+    parser.add_argument("programs", nargs="+", help="programas (texto ou .bin)")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--socket", default="maua.sock", help="socket Unix do servidor (padrão: maua.sock)")
+    where.add_argument("--port", type=int, default=None, help="porta TCP do servidor em 127.0.0.1")
+    parser.add_argument("-o", "--output", default=None, help="grava os resultados (.json ou .csv)")
+    parser.add_argument("--timeout", type=float, default=None, help="tempo máximo por programa, em segundos")
+    parser.add_argument("--max-cycles", type=int, default=None, help="número máximo de ciclos por programa")
+    parser.add_argument("--engine", choices=("myhdl", "fast"), default="myhdl",
+                        help="CPU.system() no MyHDL ou o modelo rápido do FastCPU")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        records = simulate(args.programs, None if args.port is not None else args.socket, args.port,
+                           args.engine, args.timeout, args.max_cycles)
+    except (OSError, RuntimeError, ValueError) as error:
+        print(f"Erro: {error}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - start
+
+    for record in records:
+        detail = record['error'] if record['error'] else f"{record['cycles']} ciclos"
+        print(f"{record['program']}: {record['status']} ({detail})")
+    if args.output:
+        Batch.write_results(records, args.output)
+    ok = sum(record['status'] == 'ok' for record in records)
+    print(f"{len(records)} programas em {elapsed:.2f} s, {ok} ok")
+    return 0 if ok == len(records) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,337 @@
+"""Hardware control unit for the Maua-V processor.
+
+``UC`` in CPU.py is a Python generator: it cannot be converted to HDL and
+the kernel resumes it on every step. The blocks below do the same work as
+synthesizable logic:
+
+- ``instruction_rom`` holds the program words and returns the one at ``pc``;
+- ``decoder`` splits that word into the opcode and operand fields;
+- ``control_unit`` is a state machine that runs each opcode through the
+  same micro-steps, on the same clock edges, as ``UC`` (EXECUTE), advances
+  ``pc`` on the idle edge that ends every instruction (FETCH) and finally
+  walks the register file and memory for the dump (DUMP_REGS, DUMP_MEM).
+
+Driven through the same datapath, it reaches the same final state in the
+same number of cycles as ``UC``. ``controller`` groups the three blocks and
+can be converted to Verilog or VHDL with ``convert()``.
+"""
+
+import argparse
+
+from myhdl import block, Signal, ResetSignal, intbv, enum, always_comb, always_seq
+
+import Branch
+import Program
+
+t_phase = enum('EXECUTE', 'FETCH', 'DUMP_REGS', 'DUMP_MEM', 'HALT')
+
+DUMP_REGISTERS = 32
+DUMP_MEMORY = 16
+VECTOR = Program.VECTOR
+
+
+def program_words(program):
+    """Return the 32-bit words of a decoded program, as a tuple for the ROM."""
+    if Branch.used(program):
+        raise ValueError("A UC em hardware não executa comparações, desvios e cópias em bloco")
+    words = []
+    for pc in range(Program.length(program)):
+        opcode, *fields = Program.instruction(program, pc)
+        words.append(Program.encode(opcode, fields[:len(Program.FIELDS[opcode])]))
+    return tuple(words)
+
+
+@block
+def instruction_rom(pc, instr, words):
+    # words: program words; one zero word past the end keeps pc == len(words) valid
+    content = tuple(words) + (0,)
+
+    @always_comb
+    def read():
+        instr.next = content[int(pc)]
+
+    return read
+
+
+@block
+def decoder(instr, opcode, f0, f1, f2, f3):
+    # Fields are the slices of Program.FIELDS: text column a is word bit 31 - a
+
+    @always_comb
+    def decode():
+        opcode.next = instr[32:29]
+        f0.next = 0
+        f1.next = 0
+        f2.next = 0
+        f3.next = 0
+        if instr[32:29] == 0 or instr[32:29] == 6:
+            f0.next = instr[28:21]
+            if instr[32:29] == 0:
+                f1.next = instr[20:13]
+            else:
+                f1.next = instr[20:16]
+        else:
+            f0.next = instr[28:24]
+            if instr[32:29] == 1 or instr[32:29] == 5:
+                f1.next = instr[23:16]
+            elif instr[32:29] == 2:
+                f1.next = instr[18:14]
+                f2.next = instr[24:19]
+                f3.next = instr[13:9]
+            elif instr[32:29] == 3 or instr[32:29] == 4:
+                f1.next = instr[23:19]
+                f2.next = instr[18:14]
+
+    return decode
+
+
+@block
+def control_unit(clk, reset, opcode, f0, f1, f2, f3, pc, phase, step, index, count,
+                 write_enable, addr, data_in, data_out, operation, num1, num2, result, alu_enable,
+                 reg_write, regWrite_addr, regRead_addr, write_data, read_data, aux, aux1,
+                 vnum1, vnum2, vresult, vreg_write, vwrite_data, vread_data):
+    # count: number of instructions in the ROM
+    # phase, step, index: state of the machine, exported for the testbench
+    # alu_enable: lets the ALU evaluate on the edges after num1, num2 or operation change
+    # vnum1 ... vread_data: 32-bit vector path, used by operations from VECTOR up
+
+    @always_seq(clk.posedge, reset=reset)
+    def fsm():
+        if phase == t_phase.EXECUTE:
+            if pc == count:
+                # Program done: idle edge, then dump
+                write_enable.next = False
+                reg_write.next = False
+                regRead_addr.next = 0
+                index.next = 0
+                phase.next = t_phase.DUMP_REGS
+            else:
+                if opcode == 0:
+                    if step == 0:
+                        write_enable.next = True
+                        addr.next = f0
+                    elif step == 1:
+                        data_in.next = f1
+                elif opcode == 1:
+                    if step == 0:
+                        reg_write.next = True
+                        regWrite_addr.next = f0[5:]
+                    elif step == 1:
+                        write_data.next = f1
+                elif opcode == 2:
+                    if step == 0:
+                        reg_write.next = False
+                        regRead_addr.next = f0[5:]
+                    elif step == 1:
+                        if f2 >= VECTOR:
+                            vnum1.next = vread_data
+                        else:
+                            num1.next = read_data
+                        alu_enable.next = True
+                    elif step == 2:
+                        regRead_addr.next = f1[5:]
+                        alu_enable.next = False
+                    elif step == 3:
+                        if f2 >= VECTOR:
+                            vnum2.next = vread_data
+                        else:
+                            num2.next = read_data
+                        alu_enable.next = True
+                    elif step == 4:
+                        operation.next = f2[5:]
+                    elif step == 5:
+                        if f2 >= VECTOR:
+                            reg_write.next = False
+                        else:
+                            reg_write.next = True
+                        regWrite_addr.next = f3[5:]
+                        alu_enable.next = False
+                    elif step == 6:
+                        if f2 >= VECTOR:
+                            vwrite_data.next = vresult
+                            vreg_write.next = True
+                        else:
+                            write_data.next = result
+                    elif step == 7:
+                        vreg_write.next = False
+                elif opcode == 3:
+                    if step == 0:
+                        write_enable.next = False
+                        addr.next = f1
+                    elif step == 1:
+                        aux1.next = data_out
+                    elif step == 2:
+                        write_enable.next = False
+                        addr.next = f0
+                    elif step == 3:
+                        aux.next = data_out
+                    elif step == 4:
+                        addr.next = f1
+                        write_enable.next = True
+                        data_in.next = aux
+                    elif step == 5:
+                        write_enable.next = False
+                        addr.next = f2
+                    elif step == 6:
+                        aux.next = data_out
+                    elif step == 7:
+                        addr.next = f0
+                        write_enable.next = True
+                        data_in.next = aux
+                    elif step == 8:
+                        write_enable.next = False
+                        addr.next = f1
+                    elif step == 9:
+                        aux.next = data_out
+                    elif step == 10:
+                        addr.next = f2
+                        write_enable.next = True
+                        data_in.next = aux
+                    elif step == 11:
+                        addr.next = f1
+                        write_enable.next = True
+                        data_in.next = aux1
+                elif opcode == 4:
+                    if step == 0:
+                        reg_write.next = False
+                        regRead_addr.next = f1[5:]
+                    elif step == 1:
+                        aux1.next = read_data
+                    elif step == 2:
+                        reg_write.next = False
+                        regRead_addr.next = f0[5:]
+                    elif step == 3:
+                        aux.next = read_data
+                    elif step == 4:
+                        regWrite_addr.next = f1[5:]
+                        reg_write.next = True
+                        write_data.next = aux
+                    elif step == 5:
+                        reg_write.next = False
+                        regRead_addr.next = f2[5:]
+                    elif step == 6:
+                        aux.next = read_data
+                    elif step == 7:
+                        regWrite_addr.next = f0[5:]
+                        reg_write.next = True
+                        write_data.next = aux
+                    elif step == 8:
+                        reg_write.next = False
+                        regRead_addr.next = f1[5:]
+                    elif step == 9:
+                        aux.next = read_data
+                    elif step == 10:
+                        regWrite_addr.next = f2[5:]
+                        reg_write.next = True
+                        write_data.next = aux
+                    elif step == 11:
+                        regWrite_addr.next = f1[5:]
+                        reg_write.next = True
+                        write_data.next = aux1
+                elif opcode == 5:
+                    if step == 0:
+                        reg_write.next = False
+                        regRead_addr.next = f0[5:]
+                    elif step == 1:
+                        write_enable.next = True
+                        addr.next = f1
+                    elif step == 2:
+                        data_in.next = read_data
+                elif opcode == 6:
+                    if step == 0:
+                        write_enable.next = False
+                        addr.next = f0
+                    elif step == 1:
+                        reg_write.next = True
+                        regWrite_addr.next = f1[5:]
+                    elif step == 2:
+                        write_data.next = data_out
+                elif opcode == 7:
+                    if step == 0:
+                        reg_write.next = True
+                        regWrite_addr.next = f0[5:]
+                    elif step == 1:
+                        write_data.next = 0
+
+                if ((opcode == 0 or opcode == 1 or opcode == 7) and step == 1) \
+                        or ((opcode == 5 or opcode == 6) and step == 2) \
+                        or (opcode == 2 and step == 6 and f2 < VECTOR) or (opcode == 2 and step == 7) \
+                        or ((opcode == 3 or opcode == 4) and step == 11):
+                    phase.next = t_phase.FETCH
+                step.next = step + 1
+
+        elif phase == t_phase.FETCH:
+            # Idle edge that ends the instruction; the ROM follows pc
+            pc.next = pc + 1
+            step.next = 0
+            phase.next = t_phase.EXECUTE
+
+        elif phase == t_phase.DUMP_REGS:
+            if index == DUMP_REGISTERS - 1:
+                addr.next = 0
+                index.next = 0
+                phase.next = t_phase.DUMP_MEM
+            else:
+                regRead_addr.next = index + 1
+                index.next = index + 1
+
+        elif phase == t_phase.DUMP_MEM:
+            if index == DUMP_MEMORY - 1:
+                phase.next = t_phase.HALT
+            else:
+                addr.next = index + 1
+                index.next = index + 1
+
+    return fsm
+
+
+@block
+def controller(clk, reset, words, pc, phase, step, index, opcode,
+               write_enable, addr, data_in, data_out, operation, num1, num2, result, alu_enable,
+               reg_write, regWrite_addr, regRead_addr, write_data, read_data, aux, aux1,
+               vnum1, vnum2, vresult, vreg_write, vwrite_data, vread_data):
+    # words: program words from program_words()
+    instr = Signal(intbv(0)[32:])
+    f0, f1, f2, f3 = [Signal(intbv(0)[8:]) for i in range(4)]
+
+    rom_inst = instruction_rom(pc, instr, words)
+    decoder_inst = decoder(instr, opcode, f0, f1, f2, f3)
+    control_inst = control_unit(clk, reset, opcode, f0, f1, f2, f3, pc, phase, step, index, len(words),
+                                write_enable, addr, data_in, data_out, operation, num1, num2, result, alu_enable,
+                                reg_write, regWrite_addr, regRead_addr, write_data, read_data, aux, aux1,
+                                vnum1, vnum2, vresult, vreg_write, vwrite_data, vread_data)
+    return rom_inst, decoder_inst, control_inst
+
+
+def state_signals(words):
+    """Return the pc, phase, step, index and opcode Signals of a controller."""
+    return (Signal(intbv(0, min=0, max=len(words) + 1)), Signal(t_phase.EXECUTE),
+            Signal(intbv(0, min=0, max=16)), Signal(intbv(0, min=0, max=DUMP_REGISTERS)),
+            Signal(intbv(0)[3:]))
+
+
+def convert(program, hdl='Verilog', path='.', name='controller'):
+    """Convert the controller of a decoded program to Verilog or VHDL files in ``path``."""
+    words = program_words(program)
+    clk = Signal(bool(0))
+    reset = ResetSignal(0, active=1, isasync=False)
+    widths = (1, 8, 8, 8, 5, 8, 8, 14, 1, 1, 5, 5, 8, 8, 8, 8, 32, 32, 32, 1, 32, 32)
+    ports = [Signal(bool(0)) if width == 1 else Signal(intbv(0)[width:]) for width in widths]
+    inst = controller(clk, reset, words, *state_signals(words), *ports)
+    inst.convert(hdl=hdl, path=path, name=name)
+
+
+def main():
+    """Convert the controller of a program file to HDL."""
+    parser = argparse.ArgumentParser(description="Converte a UC em hardware de um programa para Verilog ou VHDL.")
+    parser.add_argument("file", nargs="?", default="bits.txt", help="arquivo do programa (padrão: bits.txt)")
+    parser.add_argument("--hdl", choices=("Verilog", "VHDL"), default="Verilog", help="linguagem de saída")
+    parser.add_argument("-o", "--output", default=".", help="diretório dos arquivos gerados")
+    args = parser.parse_args()
+    convert(Program.load(args.file), args.hdl, args.output)
+    print(f"UC convertida para {args.hdl} em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,3 +1,28 @@
+from itertools import islice
+
+import numpy as np
+
+import Program
+
+# Columnar layout of decoded instructions; fields an instruction type does not use are 0
+DTYPE = np.dtype([
+    ('func', 'u1'),
+    ('address1', 'u1'),
+    ('data', 'u2'),
+    ('operation', 'u1'),
+    ('address2', 'u1'),
+    ('result', 'u2'),
+    ('aux', 'u1'),
+])
+
+TYPES = {
+    0: 'Write in Memory (W.M.)',
+    1: 'Arithmetic and Logic Operations (A.L.O.)',
+    2: 'Move in Memory (M.M.)',
+}
+
+CHUNK_SIZE = 1 << 20
+
 def parse_instruction(instruction):
     """Parse a 32-bit binary string and identify the type of instruction."""
     func = instruction[:2]
@@ -28,7 +53,7 @@ def parse_instruction(instruction):
     return result
 
 def interpret_operation(op_code):
-    """Map the 4-bit operation code to a human-readable operation name."""
+    """Map the operation code to a human-readable operation name."""
     operation_map = {
         0: 'Plus',
         1: 'Subtraction',
@@ -44,19 +69,91 @@ def interpret_operation(op_code):
     }
     return operation_map.get(op_code, "Unknown Operation")
 
-def parse_file(filename="bits.txt"):
-    """Parse the file and identify instructions for each line."""
+def field(words, start, stop):
+    """Extract the bits [start:stop] of the instruction string from an array of words."""
+    return (words >> np.uint32(32 - stop)) & np.uint32((1 << (stop - start)) - 1)
+
+def decode_words(words):
+    """Decode an array of 32-bit instruction words into a structured array, all at once."""
+    words = np.asarray(words, dtype=np.uint32)
+    func = field(words, 0, 2)
+    decoded = np.zeros(len(words), dtype=DTYPE)
+    decoded['func'] = func
+    decoded['address1'] = np.where(func < 3, field(words, 2, 10), 0)
+    decoded['data'] = np.where(func == 0, field(words, 10, 20), 0)
+    decoded['operation'] = np.where(func == 1, field(words, 10, 14), 0)
+    decoded['address2'] = np.select([func == 1, func == 2], [field(words, 14, 22), field(words, 17, 23)], 0)
+    decoded['result'] = np.where(func == 1, field(words, 22, 32), 0)
+    decoded['aux'] = np.where(func == 2, field(words, 10, 17), 0)
+    return decoded
+
+def words_from_lines(lines):
+    """Convert 32-character instruction lines into words, skipping invalid lines."""
+    valid = []
+    for instruction in lines:
+        instruction = instruction.strip()
+        if len(instruction) == 32:  # Check if it's a valid 32-bit instruction
+            valid.append(instruction)
+        else:
+            print(f"Skipping invalid instruction: {instruction}")
+    chars = np.frombuffer(''.join(valid).encode('ascii'), dtype=np.uint8).reshape(-1, 32) - ord('0')
+    if np.any(chars > 1):
+        raise ValueError("Instructions must only contain '0' and '1'")
+    weights = np.uint32(1) << np.arange(31, -1, -1, dtype=np.uint32)
+    return chars.astype(np.uint32) @ weights
+
+def iter_file(filename="bits.txt", chunk_size=CHUNK_SIZE):
+    """Decode a file (text or packed binary) chunk by chunk, yielding structured arrays.
+
+    Binary files must hold 32-bit words; Program.read_words rejects the
+    uint64 ones of 64-bit programs.
+    """
+    if Program.is_binary(filename):
+        words = np.frombuffer(Program.read_words(filename, 32), dtype=np.uint32)
+        for start in range(0, len(words), chunk_size):
+            yield decode_words(words[start:start + chunk_size])
+    else:
+        with open(filename, 'r') as file:
+            while True:
+                lines = list(islice(file, chunk_size))
+                if not lines:
+                    break
+                yield decode_words(words_from_lines(lines))
+
+def decode_file(filename="bits.txt"):
+    """Decode a whole file into one structured array."""
+    chunks = list(iter_file(filename))
+    if not chunks:
+        return np.zeros(0, dtype=DTYPE)
+    return np.concatenate(chunks)
+
+def to_dicts(decoded):
+    """Present decoded instructions as the dicts built by parse_instruction."""
     instructions = []
-    with open(filename, 'r') as file:
-        for line in file:
-            instruction = line.strip()
-            if len(instruction) == 32:  # Check if it's a valid 32-bit instruction
-                parsed_instruction = parse_instruction(instruction)
-                instructions.append(parsed_instruction)
-            else:
-                print(f"Skipping invalid instruction: {instruction}")
+    for func, address1, data, operation, address2, result, aux in decoded.tolist():
+        instruction = {}
+        if func == 0:
+            instruction['type'] = TYPES[0]
+            instruction['address1'] = address1
+            instruction['data'] = data
+        elif func == 1:
+            instruction['type'] = TYPES[1]
+            instruction['address1'] = address1
+            instruction['operation'] = interpret_operation(operation)
+            instruction['address2'] = address2
+            instruction['result'] = result
+        elif func == 2:
+            instruction['type'] = TYPES[2]
+            instruction['address1'] = address1
+            instruction['aux'] = aux
+            instruction['address2'] = address2
+        instructions.append(instruction)
     return instructions
 
+def parse_file(filename="bits.txt"):
+    """Parse the file (text or packed binary) and identify instructions for each line."""
+    return to_dicts(decode_file(filename))
+
 def main():
     """Main function to read the file and display parsed instructions."""
     instructions = parse_file("bits.txt")
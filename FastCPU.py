@@ -0,0 +1,649 @@
+"""Fast functional execution of Maua-V programs.
+
+This module runs the same programs as ``CPU.system()`` without the MyHDL
+event kernel. The machine state is kept in plain Python integers and the
+``UC`` control unit is replayed as a table of micro-steps, one per
+``yield clk.posedge``. Each clock edge applies the same sample-then-commit
+rules as the simulated hardware, so the final register file, memory and
+printed dump are identical to the MyHDL model (including its errors).
+
+Jumps and branches assign no Signal: their edges only add cycles, as many
+as the branch predictor says UC spends on them. UC does not touch memory
+while the DMA engine carries out a block move, so the words are copied at
+once and only the cycles UC waits for the engine are counted.
+
+Only the default machine is modelled: sizes and masks are those of
+``Program.DEFAULT``, and other geometries are rejected.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import Branch
+import Program
+
+# Slots of the integer machine state, one per Signal driven in CPU.system().
+(ADDR, DATA_IN, DATA_OUT, WRITE_ENABLE, OPERATION, NUM1, NUM2, RESULT,
+ REG_WRITE, REGWRITE_ADDR, REGREAD_ADDR, WRITE_DATA, READ_DATA, AUX, AUX1,
+ VNUM1, VNUM2, VRESULT, VREG_WRITE, VWRITE_DATA, VREAD_DATA, FLAGS,
+ DMA_SOURCE, DMA_DESTINATION, DMA_COUNT) = range(25)
+
+SIGNAL_COUNT = 25
+REGISTER_COUNT = 32
+MEMORY_SIZE = 256
+
+# Exclusive upper bound of every Signal, used for the intbv range checks.
+LIMITS = [1 << 8] * SIGNAL_COUNT
+LIMITS[OPERATION] = 1 << 5
+LIMITS[RESULT] = 1 << 14
+LIMITS[REGWRITE_ADDR] = 1 << 5
+LIMITS[REGREAD_ADDR] = 1 << 5
+for slot in (VNUM1, VNUM2, VRESULT, VWRITE_DATA, VREAD_DATA):
+    LIMITS[slot] = 1 << 32
+LIMITS[FLAGS] = 1 << Branch.FLAG_BITS
+LIMITS[DMA_SOURCE] = LIMITS[DMA_DESTINATION] = MEMORY_SIZE + 1
+LIMITS[DMA_COUNT] = 1 << Program.OFFSET_BITS
+
+# read_data only sees the low lane of a register.
+READ_MASK = LIMITS[READ_DATA] - 1
+LANE_MASK = (1 << Program.LANE_BITS) - 1
+
+# Kinds of value a micro-step can assign to a Signal; a COMPARISON is the
+# flags of the two Signals given.
+CONST, FIELD, SIGNAL, COMPARISON = range(4)
+
+
+def _swap(write, addr, read):
+    """Micro-steps of the three-way move UC performs for M.M. and M.R."""
+    a, b, c = (FIELD, 0), (FIELD, 1), (FIELD, 2)
+    on, off = (CONST, 1), (CONST, 0)
+    return (
+        ((write, off), (addr[0], b)),
+        ((AUX1, (SIGNAL, read)),),
+        ((write, off), (addr[0], a)),
+        ((AUX, (SIGNAL, read)),),
+        ((addr[1], b), (write, on), (addr[2], (SIGNAL, AUX))),
+        ((write, off), (addr[0], c)),
+        ((AUX, (SIGNAL, read)),),
+        ((addr[1], a), (write, on), (addr[2], (SIGNAL, AUX))),
+        ((write, off), (addr[0], b)),
+        ((AUX, (SIGNAL, read)),),
+        ((addr[1], c), (write, on), (addr[2], (SIGNAL, AUX))),
+        ((addr[1], b), (write, on), (addr[2], (SIGNAL, AUX1))),
+        (),
+    )
+
+
+# MICROCODE key of an A.L.O. with a vector operation, which takes the
+# vector path and one more edge.
+VECTOR_ALO = 8
+# MICROCODE keys of opcode 7 with the C.M.P. and B.M. functions.
+CMP = 9
+BLOCK_MOVE = 10
+# Opcodes that use the memory ports, and wait for a block move to end.
+MEMORY_OPCODES = (0, 3, 5, 6)
+
+# Signal assignments UC makes after each clock edge, per opcode. The last,
+# empty step is the edge UC waits for after finishing an instruction.
+MICROCODE = {
+    0: (
+        ((WRITE_ENABLE, (CONST, 1)), (ADDR, (FIELD, 0))),
+        ((DATA_IN, (FIELD, 1)),),
+        (),
+    ),
+    1: (
+        ((REG_WRITE, (CONST, 1)), (REGWRITE_ADDR, (FIELD, 0))),
+        ((WRITE_DATA, (FIELD, 1)),),
+        (),
+    ),
+    2: (
+        ((REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (FIELD, 0))),
+        ((NUM1, (SIGNAL, READ_DATA)),),
+        ((REGREAD_ADDR, (FIELD, 1)),),
+        ((NUM2, (SIGNAL, READ_DATA)),),
+        ((OPERATION, (FIELD, 2)),),
+        ((REG_WRITE, (CONST, 1)), (REGWRITE_ADDR, (FIELD, 3))),
+        ((WRITE_DATA, (SIGNAL, RESULT)),),
+        (),
+    ),
+    3: _swap(WRITE_ENABLE, (ADDR, ADDR, DATA_IN), DATA_OUT),
+    4: _swap(REG_WRITE, (REGREAD_ADDR, REGWRITE_ADDR, WRITE_DATA), READ_DATA),
+    5: (
+        ((REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (FIELD, 0))),
+        ((WRITE_ENABLE, (CONST, 1)), (ADDR, (FIELD, 1))),
+        ((DATA_IN, (SIGNAL, READ_DATA)),),
+        (),
+    ),
+    6: (
+        ((WRITE_ENABLE, (CONST, 0)), (ADDR, (FIELD, 0))),
+        ((REG_WRITE, (CONST, 1)), (REGWRITE_ADDR, (FIELD, 1))),
+        ((WRITE_DATA, (SIGNAL, DATA_OUT)),),
+        (),
+    ),
+    7: (
+        ((REG_WRITE, (CONST, 1)), (REGWRITE_ADDR, (FIELD, 0))),
+        ((WRITE_DATA, (CONST, 0)),),
+        (),
+    ),
+    VECTOR_ALO: (
+        ((REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (FIELD, 0))),
+        ((VNUM1, (SIGNAL, VREAD_DATA)),),
+        ((REGREAD_ADDR, (FIELD, 1)),),
+        ((VNUM2, (SIGNAL, VREAD_DATA)),),
+        ((OPERATION, (FIELD, 2)),),
+        ((REG_WRITE, (CONST, 0)), (REGWRITE_ADDR, (FIELD, 3))),
+        ((VWRITE_DATA, (SIGNAL, VRESULT)), (VREG_WRITE, (CONST, 1))),
+        ((VREG_WRITE, (CONST, 0)),),
+        (),
+    ),
+    CMP: (
+        ((REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (FIELD, 0))),
+        ((AUX, (SIGNAL, READ_DATA)), (REGREAD_ADDR, (FIELD, 2))),
+        ((FLAGS, (COMPARISON, (AUX, READ_DATA))),),
+        (),
+    ),
+    BLOCK_MOVE: (
+        ((WRITE_ENABLE, (CONST, 0)), (REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (FIELD, 0))),
+        ((DMA_SOURCE, (SIGNAL, VREAD_DATA)), (REGREAD_ADDR, (FIELD, 2))),
+        ((DMA_DESTINATION, (SIGNAL, VREAD_DATA)), (DMA_COUNT, (FIELD, 3))),
+        (),
+    ),
+}
+
+# Edges UC spends after the program: one idle edge, 32 register reads and
+# 16 memory reads for the final dump.
+DUMP_REGISTERS = 32
+DUMP_MEMORY = 16
+DUMP_CYCLES = 1 + DUMP_REGISTERS + DUMP_MEMORY
+
+# Edges of each opcode, and byte tables marking the A.L.O. records and the
+# vector operations, for count_cycles().
+EDGES = tuple(len(MICROCODE[opcode]) for opcode in range(len(Program.FIELDS)))
+ALO_BYTES = bytes(0xFF if opcode == 2 else 0 for opcode in range(256))
+VECTOR_BYTES = bytes(1 if operation >= Program.VECTOR else 0 for operation in range(256))
+
+
+def count_cycles(program):
+    """Return the clock edges UC needs to run a decoded program and dump state.
+
+    Only straight-line programs: the cycles of branches depend on the path
+    taken and on the predictor, so run() counts them as it goes.
+    """
+    opcodes = bytes(program[::Program.RECORD])
+    # One bit per vector A.L.O., from a single AND of two integers
+    vector = (int.from_bytes(opcodes.translate(ALO_BYTES), 'big')
+              & int.from_bytes(bytes(program[3::Program.RECORD]).translate(VECTOR_BYTES), 'big')).bit_count()
+    extra = len(MICROCODE[VECTOR_ALO]) - len(MICROCODE[2])
+    return sum(edges * opcodes.count(opcode) for opcode, edges in enumerate(EDGES)) + vector * extra + DUMP_CYCLES
+
+
+def dump_text(registers, memory):
+    """Format the register and memory dump UC prints at the end of a run."""
+    lines = ["\nConteúdo dos Registradores:"]
+    lines.extend(f"Registrador {i:04b}: {registers[i] & READ_MASK:02x}" for i in range(DUMP_REGISTERS))
+    lines.append("\nConteúdo da Memória:")
+    lines.extend(f"Endereço {i:04b}: {memory[i]:02x}" for i in range(DUMP_MEMORY))
+    return "\n".join(lines) + "\n"
+
+
+def _check(value, limit):
+    """Apply the range check MyHDL does when an intbv Signal is assigned."""
+    if not isinstance(value, int):
+        raise TypeError("Expected int or intbv, got %s" % type(value))
+    if value >= limit:
+        raise ValueError("intbv value %s >= maximum %s" % (value, limit))
+    if value < 0:
+        raise ValueError("intbv value %s < minimum %s" % (value, 0))
+    return value
+
+
+def alu(operation, num1, num2, result):
+    """Return the next value of ``result``, as ALU.alu_logic computes it."""
+    if operation == 0:
+        value = num1 + num2
+    elif operation == 1:
+        value = num1 - num2
+    elif operation == 2:
+        value = num1 * num2
+    elif operation == 3:
+        # True division gives a float, which the intbv refuses
+        return _check(num1 / num2, LIMITS[RESULT])
+    elif operation == 4:
+        value = num1 ** num2
+    elif operation == 5:
+        value = num1 % num2
+    elif operation == 6:
+        value = num1 & num2
+    elif operation == 7:
+        value = num1 | num2
+    elif operation == 8:
+        value = ~(num1 & num2)
+    elif operation == 9:
+        value = ~(num1 | num2)
+    elif operation == 10:
+        value = num1 ^ num2
+    elif operation == 11:
+        value = ~(num1 ^ num2)
+    elif operation == 12:
+        # ~ on the 8-bit num1 Signal keeps the value inside its width.
+        value = ~num1 & 0xFF
+    else:
+        return result
+    if 0 <= value < LIMITS[RESULT]:
+        return value
+    return _check(value, LIMITS[RESULT])
+
+
+def valu(operation, vnum1, vnum2, vresult):
+    """Return the next value of ``vresult``, computing each lane on its own."""
+    code = operation - Program.VECTOR
+    if code == 6:
+        return (vnum1 << Program.LANE_BITS | vnum2 & LANE_MASK) & (LIMITS[VRESULT] - 1)
+    if not 0 <= code < 6:
+        return vresult
+    value = 0
+    for lane in range(Program.LANES):
+        shift = lane * Program.LANE_BITS
+        a = vnum1 >> shift & LANE_MASK
+        b = vnum2 >> shift & LANE_MASK
+        if code == 0:
+            lane_value = a + b
+        elif code == 1:
+            lane_value = a - b
+        elif code == 2:
+            lane_value = a & b
+        elif code == 3:
+            lane_value = a | b
+        elif code == 4:
+            lane_value = a ^ b
+        else:
+            lane_value = ~a
+        value |= (lane_value & LANE_MASK) << shift
+    return value
+
+
+def new_state():
+    """Return a reset machine: Signals, register file and memory all zero."""
+    return {
+        'signals': [0] * SIGNAL_COUNT,
+        'registers': [0] * REGISTER_COUNT,
+        'memory': [0] * MEMORY_SIZE,
+        'cycles': 0,
+        'alu_inputs': (0, 0, 0, 0, 0),
+    }
+
+
+def edge(state, step=(), fields=()):
+    """Advance the machine by one clock edge.
+
+    The clocked blocks (register write, memory write, ALU) and UC all read
+    the values from before the edge; their updates are committed together
+    and the combinational reads settle afterwards, as in the MyHDL kernel.
+    """
+    s = state['signals']
+
+    if step:
+        updates = []
+        for dest, (kind, arg) in step:
+            if kind == CONST:
+                value = arg
+            elif kind == FIELD:
+                value = fields[arg]
+            elif kind == COMPARISON:
+                value = Branch.compare(s[arg[0]], s[arg[1]])
+            else:
+                value = s[arg]
+                if value >= LIMITS[dest]:
+                    _check(value, LIMITS[dest])
+            updates.append((dest, value))
+    else:
+        updates = ()
+
+    # The ALU output only changes when one of its inputs did; a vector
+    # operation only changes vresult, any other only result.
+    alu_inputs = (s[OPERATION], s[NUM1], s[NUM2], s[VNUM1], s[VNUM2])
+    if alu_inputs != state['alu_inputs']:
+        if alu_inputs[0] >= Program.VECTOR:
+            s[VRESULT] = valu(alu_inputs[0], alu_inputs[3], alu_inputs[4], s[VRESULT])
+        else:
+            s[RESULT] = alu(alu_inputs[0], alu_inputs[1], alu_inputs[2], s[RESULT])
+        state['alu_inputs'] = alu_inputs
+
+    regs = state['registers']
+    mem = state['memory']
+    if s[REG_WRITE]:
+        regs[s[REGWRITE_ADDR]] = s[WRITE_DATA]
+    if s[VREG_WRITE]:
+        regs[s[REGWRITE_ADDR]] = s[VWRITE_DATA]
+    if s[WRITE_ENABLE]:
+        mem[s[ADDR]] = s[DATA_IN]
+    for dest, value in updates:
+        s[dest] = value
+
+    s[VREAD_DATA] = regs[s[REGREAD_ADDR]]
+    s[READ_DATA] = s[VREAD_DATA] & READ_MASK
+    if not s[WRITE_ENABLE]:
+        s[DATA_OUT] = mem[s[ADDR]]
+    state['cycles'] += 1
+
+
+def _reads(step):
+    """Return the Signals a micro-step reads."""
+    slots = set()
+    for _, (kind, arg) in step:
+        if kind == SIGNAL:
+            slots.add(arg)
+        elif kind == COMPARISON:
+            slots.update(arg)
+    return slots
+
+
+def _compile(opcode, narrow=False):
+    """Turn the micro-steps of an opcode into one straight-line function.
+
+    The generated code performs exactly what ``edge`` does for each step,
+    but without interpreting the step tables at run time. The ALU is only
+    re-evaluated on the edge after one of its inputs was assigned, and only
+    on the path the opcode feeds: the other keeps its inputs. Once a step
+    sets reg_write, vreg_write or write_enable to a constant, the writes
+    and reads they guard are emitted unconditionally or dropped (vreg_write
+    is low between instructions). read_data and vread_data are only stored
+    before a step that reads them and on the last edge, and data_out is not
+    stored on an edge whose value the next edge overwrites. ``narrow`` code
+    does not mask the register reads and is only exact while every register
+    fits in read_data.
+    """
+    body = []
+    alu_dirty = False
+    steps = MICROCODE[opcode]
+    # Control Signals whose value is known at this point of the instruction
+    known = {VREG_WRITE: 0}
+    for n, step in enumerate(steps):
+        last = n + 1 == len(steps)
+        following = set() if last else _reads(steps[n + 1])
+        values = []
+        for k, (dest, (kind, arg)) in enumerate(step):
+            if kind == CONST:
+                values.append(repr(arg))
+            elif kind == FIELD:
+                values.append(f"p[i + {1 + arg}]")
+            elif kind == COMPARISON:
+                body.append(f"v{k} = compare(s[{arg[0]}], s[{arg[1]}])")
+                values.append(f"v{k}")
+            else:
+                body.append(f"v{k} = s[{arg}]")
+                if LIMITS[arg] > LIMITS[dest]:
+                    body.append(f"if v{k} >= {LIMITS[dest]}: _check(v{k}, {LIMITS[dest]})")
+                values.append(f"v{k}")
+        if alu_dirty and opcode == VECTOR_ALO:
+            body.append(f"s[{VRESULT}] = valu(s[{OPERATION}], s[{VNUM1}], s[{VNUM2}], s[{VRESULT}])")
+        elif alu_dirty:
+            body.append(f"s[{RESULT}] = alu(s[{OPERATION}], s[{NUM1}], s[{NUM2}], s[{RESULT}])")
+        for flag, write in ((REG_WRITE, f"regs[s[{REGWRITE_ADDR}]] = s[{WRITE_DATA}]"),
+                            (VREG_WRITE, f"regs[s[{REGWRITE_ADDR}]] = s[{VWRITE_DATA}]"),
+                            (WRITE_ENABLE, f"mem[s[{ADDR}]] = s[{DATA_IN}]")):
+            if flag not in known:
+                body.append(f"if s[{flag}]: {write}")
+            elif known[flag]:
+                body.append(write)
+        for (dest, (kind, arg)), value in zip(step, values):
+            body.append(f"s[{dest}] = {value}")
+            if kind == CONST:
+                known[dest] = arg
+            else:
+                known.pop(dest, None)
+        wide_read = last or VREAD_DATA in following
+        if wide_read or READ_DATA in following:
+            if narrow:
+                body.append(f"s[{VREAD_DATA}] = s[{READ_DATA}] = regs[s[{REGREAD_ADDR}]]" if wide_read else
+                            f"s[{READ_DATA}] = regs[s[{REGREAD_ADDR}]]")
+            elif wide_read:
+                body.append(f"s[{VREAD_DATA}] = value = regs[s[{REGREAD_ADDR}]]")
+                body.append(f"s[{READ_DATA}] = value & {READ_MASK}")
+            else:
+                body.append(f"s[{READ_DATA}] = regs[s[{REGREAD_ADDR}]] & {READ_MASK}")
+        # data_out keeps its value while write_enable is set, so it can only
+        # be skipped when the next edge stores it again
+        overwritten = False
+        if not last and DATA_OUT not in following:
+            enable = known.get(WRITE_ENABLE)
+            for dest, (kind, arg) in steps[n + 1]:
+                if dest == WRITE_ENABLE:
+                    enable = arg if kind == CONST else None
+            overwritten = enable == 0
+        if WRITE_ENABLE not in known:
+            body.append(f"if not s[{WRITE_ENABLE}]: s[{DATA_OUT}] = mem[s[{ADDR}]]")
+        elif not known[WRITE_ENABLE] and not overwritten:
+            body.append(f"s[{DATA_OUT}] = mem[s[{ADDR}]]")
+        alu_dirty = any(dest in (OPERATION, NUM1, NUM2, VNUM1, VNUM2) for dest, _ in step)
+
+    source = "def execute(s, regs, mem, p, i):\n" + "".join(f"    {line}\n" for line in body)
+    namespace = {'alu': alu, 'valu': valu, 'compare': Branch.compare, '_check': _check}
+    exec(source, namespace)
+    return namespace['execute']
+
+
+# One compiled function per opcode, used by run() for the program body.
+EXECUTE = {opcode: _compile(opcode) for opcode in MICROCODE}
+NARROW = {opcode: _compile(opcode, narrow=True) for opcode in MICROCODE}
+
+
+def _cut(state, program, i, opcode, edges, max_cycles):
+    """Run the first edges of the instruction the cycle limit stops, as MyHDL does.
+
+    Errors on those edges are raised; the returned state has not halted.
+    """
+    s = state['signals']
+    state['alu_inputs'] = (s[OPERATION], s[NUM1], s[NUM2], s[VNUM1], s[VNUM2])
+    for step in MICROCODE[opcode][:edges]:
+        edge(state, step, program[i + 1:i + Program.RECORD])
+    state['cycles'] = max_cycles
+    return state
+
+
+def run(program, verbose=True, predictor=None, max_cycles=None, geometry=None):
+    """Run a decoded program and return the final state.
+
+    The returned dict holds ``registers``, ``memory``, ``cycles``, the
+    ``dump`` text UC prints at the end of the run, the ``instructions``
+    executed and whether UC ``halted``, which it does not when the run
+    takes more than max_cycles, as in CPU.simulate(). predictor is None
+    (static prediction) or a Branch.Predictor; when the program branched,
+    its summary is returned as ``branches``. geometry is None or a dict
+    from Program.geometry(); only the default machine runs here.
+    """
+    if (geometry is not None and geometry['fields'] is not Program.FIELDS) \
+            or getattr(program, 'typecode', Program.DEFAULT['record']) != Program.DEFAULT['record']:
+        raise ValueError("O motor rápido só está disponível na configuração padrão")
+    state = new_state()
+    s = state['signals']
+    regs = state['registers']
+    mem = state['memory']
+    state['halted'] = False
+    length = Program.length(program)
+
+    # Registers only get wider than read_data through the vector path, so
+    # the narrow code is exact up to the first vector instruction.
+    execute = NARROW
+    if not Branch.used(program):
+        # The budget is only checked when the program does not fit in it
+        budget = max_cycles
+        if max_cycles is not None and count_cycles(program) - DUMP_CYCLES <= max_cycles:
+            budget = None
+        cycles = 0
+        for i in range(0, len(program), Program.RECORD):
+            opcode = program[i]
+            if opcode == 2 and program[i + 3] >= Program.VECTOR:
+                opcode = VECTOR_ALO
+                execute = EXECUTE
+            if budget is not None:
+                if cycles + len(MICROCODE[opcode]) > budget:
+                    return _cut(state, program, i, opcode, budget - cycles, budget)
+                cycles += len(MICROCODE[opcode])
+            execute[opcode](s, regs, mem, program, i)
+        cycles = count_cycles(program) - DUMP_CYCLES
+        instructions = length
+    else:
+        if predictor is None:
+            predictor = Branch.Predictor()
+        # moved: cycle of the last word of the running block move
+        pc = cycles = instructions = moved = 0
+        while pc < length:
+            if max_cycles is not None and cycles > max_cycles:
+                state['cycles'] = max_cycles
+                return state
+            i = pc * Program.RECORD
+            opcode = program[i]
+            instructions += 1
+            if opcode == 2 and program[i + 3] >= Program.VECTOR:
+                opcode = VECTOR_ALO
+                execute = EXECUTE
+            elif opcode == 7 and program[i + 2] == Branch.COMPARE:
+                opcode = CMP
+            elif opcode == 7 and program[i + 2] == Branch.BLOCK_MOVE:
+                cycles = max(cycles, moved)
+                execute[BLOCK_MOVE](s, regs, mem, program, i)
+                source, destination, words = s[DMA_SOURCE], s[DMA_DESTINATION], program[i + 4]
+                if max(source, destination) + words > MEMORY_SIZE:
+                    raise ValueError(f"Cópia em bloco da instrução {pc} para fora da memória")
+                for k in range(words):
+                    mem[destination + k] = mem[source + k]
+                s[DMA_SOURCE] += words
+                s[DMA_DESTINATION] += words
+                s[DMA_COUNT] = 0
+                s[DATA_OUT] = mem[s[ADDR]]
+                cycles += len(MICROCODE[BLOCK_MOVE])
+                # The engine copies on the edges after the third one
+                moved = cycles - 1 + words
+                pc += 1
+                continue
+            elif opcode in MEMORY_OPCODES:
+                cycles = max(cycles, moved)
+            elif opcode == 7 and Branch.JUMP <= program[i + 2] <= Branch.BGE:
+                function = program[i + 2]
+                goal = Branch.target(program, pc, program[i + 4])
+                went = Branch.taken(function, s[FLAGS])
+                cycles += Branch.BRANCH_EDGES + predictor.resolve(pc, function, goal, went)
+                pc = goal if went else pc + 1
+                continue
+            if max_cycles is not None and cycles + len(MICROCODE[opcode]) > max_cycles:
+                return _cut(state, program, i, opcode, max_cycles - cycles, max_cycles)
+            execute[opcode](s, regs, mem, program, i)
+            cycles += len(MICROCODE[opcode])
+            pc += 1
+        cycles = max(cycles, moved)
+        if predictor.stats['branches']:
+            state['branches'] = predictor.summary()
+    if max_cycles is not None and cycles + DUMP_CYCLES > max_cycles:
+        state['cycles'] = max_cycles
+        return state
+    state['cycles'] = cycles
+    state['program_cycles'] = cycles
+    state['instructions'] = instructions
+    state['alu_inputs'] = (s[OPERATION], s[NUM1], s[NUM2], s[VNUM1], s[VNUM2])
+
+    lines = ["\nConteúdo dos Registradores:"]
+    edge(state, ((WRITE_ENABLE, (CONST, 0)), (REG_WRITE, (CONST, 0)), (REGREAD_ADDR, (CONST, 0))))
+    for i in range(DUMP_REGISTERS):
+        lines.append(f"Registrador {i:04b}: {s[READ_DATA]:02x}")
+        if i + 1 < DUMP_REGISTERS:
+            edge(state, ((REGREAD_ADDR, (CONST, i + 1)),))
+        else:
+            edge(state, ((ADDR, (CONST, 0)),))
+    lines.append("\nConteúdo da Memória:")
+    for i in range(DUMP_MEMORY):
+        lines.append(f"Endereço {i:04b}: {s[DATA_OUT]:02x}")
+        edge(state, ((ADDR, (CONST, i + 1)),) if i + 1 < DUMP_MEMORY else ())
+
+    state['dump'] = "\n".join(lines) + "\n"
+    state['halted'] = True
+    if verbose:
+        print(state['dump'], end="")
+    return state
+
+
+def run_myhdl(program, max_cycles=None):
+    """Run a decoded program through CPU.system() and return its final state and dump."""
+    import CPU
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        state = CPU.simulate(program, max_cycles)
+    state['dump'] = out.getvalue()
+    return state
+
+
+def check(program, max_cycles=None):
+    """Run a decoded program on both engines and return the list of differences.
+
+    An empty list means the final registers, memory, cycle count and printed
+    dump agree.
+    When the program fails, both engines must raise the same exception type.
+    Both engines stop after max_cycles; a run that does not end by then is
+    reported as a difference, since its final state cannot be compared.
+    """
+    results = []
+    for engine in (run, run_myhdl):
+        try:
+            if engine is run:
+                results.append(engine(program, verbose=False, max_cycles=max_cycles))
+            else:
+                results.append(engine(program, max_cycles))
+        except Exception as error:
+            results.append(error)
+
+    fast, slow = results
+    if isinstance(fast, Exception) or isinstance(slow, Exception):
+        if type(fast) is type(slow):
+            return []
+        return [f"erro: fast={fast!r} myhdl={slow!r}"]
+    if not (fast['halted'] and slow['halted']):
+        if fast['halted'] or slow['halted']:
+            return [f"terminou: fast={fast['halted']} myhdl={slow['halted']}"]
+        return [f"limite de {max_cycles} ciclos atingido antes do fim do programa"]
+
+    differences = []
+    if fast['cycles'] != slow['cycles']:
+        differences.append(f"ciclos: fast={fast['cycles']} myhdl={slow['cycles']}")
+    for i, (a, b) in enumerate(zip(fast['registers'], slow['registers'])):
+        if a != b:
+            differences.append(f"registrador {i}: fast={a} myhdl={b}")
+    for i, (a, b) in enumerate(zip(fast['memory'], slow['memory'])):
+        if a != b:
+            differences.append(f"memória {i}: fast={a} myhdl={b}")
+    if fast['dump'] != slow['dump']:
+        differences.append("o texto do dump difere")
+    return differences
+
+
+def main():
+    """Run a program file on the fast engine, or compare it with MyHDL."""
+    parser = argparse.ArgumentParser(description="Simulador funcional rápido do Maua-V.")
+    parser.add_argument("file", nargs="?", default="bits.txt", help="arquivo do programa (padrão: bits.txt)")
+    parser.add_argument("--check", action="store_true", help="roda também CPU.system() e compara o estado final")
+    parser.add_argument("--max-cycles", type=int, default=None, help="número máximo de ciclos de clock")
+    args = parser.parse_args()
+
+    program = Program.load(args.file)
+
+    if args.check:
+        differences = check(program, args.max_cycles)
+        for difference in differences:
+            print(difference)
+        print("OK" if not differences else f"{len(differences)} diferenças")
+        return 0 if not differences else 1
+
+    start = time.perf_counter()
+    state = run(program, max_cycles=args.max_cycles)
+    if not state['halted']:
+        print(f"\nLimite de {args.max_cycles} ciclos atingido antes do fim do programa")
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"\n{state['cycles']} ciclos em {elapsed:.6f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
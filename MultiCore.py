@@ -0,0 +1,235 @@
+"""Multi-core Maua-V system: several cores sharing one memory through a bus.
+
+Each core is a ``CPU.system()`` with its own UC, ALU, register file and
+program. The ``mem`` array is shared: every core has its own memory port,
+and all ports sit on one bus that carries one access per cycle. Accesses
+are seen on the ports much as in Cache.py, but UC leaves ``write_enable``
+set over many edges, so a write is only a new access when the port moves
+to another address or another word; holding the same write needs no bus.
+A read is an access when a port moves to a new address or reads again an
+address just written.
+
+When several cores need the bus in the same cycle, the arbiter grants it
+to one of them, in round-robin order or by fixed priority (core 0 first),
+and holds the clock of the others. They stall for that cycle and ask again
+on the next one, while the free running clock keeps counting. A core that
+has finished its program gets no more clock edges.
+
+A run reports, per core, the cycles until its last instruction, the
+instructions and the cycles stalled waiting for the bus, and for the whole
+system the instructions per cycle of all cores together.
+"""
+
+import argparse
+import time
+from array import array
+
+from myhdl import block, Signal, always, delay, StopSimulation
+
+import Branch
+import Cache
+import CPU
+import Program
+
+POLICIES = ('round-robin', 'priority')
+
+
+class Bus:
+    """Arbitration policy and statistics of the shared memory bus."""
+
+    def __init__(self, cores, policy='round-robin'):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de arbitragem desconhecida: {policy}")
+        if cores < 1:
+            raise ValueError("O sistema precisa de pelo menos um núcleo")
+        self.cores = cores
+        self.policy = policy
+        # Core that comes first in the next round-robin arbitration
+        self.turn = 0
+        self.stats = {'accesses': [0] * cores, 'stalls': [0] * cores}
+
+    def grant(self, requests):
+        """Return the core, among those requesting the bus, that gets it."""
+        if self.policy == 'priority':
+            return min(requests)
+        winner = min(requests, key=lambda core: (core - self.turn) % self.cores)
+        self.turn = (winner + 1) % self.cores
+        return winner
+
+
+@block
+def bus(source, clks, ports, states, model):
+    # source: free running clock
+    # clks: clock of each core, held low while the core waits for the bus
+    # ports: (addr, data_in, write_enable) of each core's memory port
+    # states: state dict of each core; once 'halted', its clock stops
+    # model: Bus instance holding the policy and the statistics
+
+    last = [{'addr': 0, 'data': 0, 'write': False} for i in clks]
+
+    def request(core):
+        addr, data_in, write_enable = ports[core]
+        return Cache.accessed(last[core], addr, data_in, write_enable)
+
+    @always(source)
+    def arbiter():
+        if source:
+            running = [core for core, state in enumerate(states) if not state['halted']]
+            if not running:
+                raise StopSimulation("Todos os núcleos terminaram")
+            requests = [core for core in running if request(core)]
+            winner = model.grant(requests) if requests else None
+            for core in running:
+                if core in requests:
+                    if core != winner:
+                        model.stats['stalls'][core] += 1
+                        continue
+                    model.stats['accesses'][core] += 1
+                addr, data_in, write_enable = ports[core]
+                last[core].update(addr=int(addr), data=int(data_in), write=bool(write_enable))
+                clks[core].next = True
+        else:
+            for clk in clks:
+                clk.next = False
+
+    return arbiter
+
+
+@block
+def system(programs, states, model, mem, geometry=None):
+    # programs: decoded program of each core
+    # states: one dict per core with 'halted' False; receives the core's
+    #         final registers, cycles and instructions, as in CPU.system()
+    # model: Bus instance for as many cores as programs
+    # mem: shared array of memory words, as CPU.system() builds it
+    # geometry: as in CPU.system(), the same for every core
+    source = Signal(bool(0))
+    written = Signal(bool(0))
+    clks = []
+    ports = []
+    cores = []
+    for program, state in zip(programs, states):
+        port = {'clk': Signal(bool(0)), 'mem': mem, 'written': written}
+        cores.append(CPU.system(program, state, geometry=geometry, bus=port))
+        clks.append(port['clk'])
+        ports.append((port['addr'], port['data_in'], port['write_enable']))
+
+    @always(delay(CPU.CLOCK_PERIOD // 2))
+    def clkgen():
+        source.next = not source
+
+    return clkgen, bus(source, clks, ports, states, model), cores
+
+
+def simulate(programs, policy='round-robin', max_cycles=None, geometry=None):
+    """Run one program per core until every core halts or max_cycles have elapsed.
+
+    Returns a dict with one record per core (final registers, cycles until
+    its last instruction, instructions, bus accesses and stall cycles), the
+    shared memory, the cycles and instructions of the whole system, its
+    instructions per cycle, the wall time and whether every core halted.
+    """
+    g = Program.DEFAULT if geometry is None else geometry
+    states = [{'halted': False} for program in programs]
+    model = Bus(len(programs), policy)
+    mem = array(Program.typecode(g['word_width']), [0]) * g['memory_size']
+    tb = system(programs, states, model, mem, geometry)
+    start = time.perf_counter()
+    try:
+        if max_cycles is None:
+            tb.run_sim(quiet=1)
+        else:
+            tb.run_sim(max_cycles * CPU.CLOCK_PERIOD, quiet=1)
+    finally:
+        seconds = time.perf_counter() - start
+        tb.quit_sim()
+
+    cores = []
+    for core, state in enumerate(states):
+        cores.append({
+            'halted': state['halted'],
+            'registers': state.get('registers'),
+            'cycles': state['cycles'] if state['halted'] else max_cycles,
+            'instructions': state.get('instructions'),
+            'accesses': model.stats['accesses'][core],
+            'stalls': model.stats['stalls'][core],
+        })
+    halted = all(core['halted'] for core in cores)
+    cycles = max((core['cycles'] for core in cores), default=0)
+    instructions = sum(core['instructions'] for core in cores) if halted else None
+    return {
+        'policy': policy,
+        'cores': cores,
+        'memory': mem.tolist(),
+        'cycles': cycles,
+        'instructions': instructions,
+        'ipc': instructions / cycles if halted and cycles else 0.0,
+        'stalls': sum(model.stats['stalls']),
+        'seconds': seconds,
+        'halted': halted,
+    }
+
+
+def report(result, names):
+    """Print the per-core and aggregate results of a run."""
+    print(f"{'núcleo':>6} {'programa':20} {'instruções':>10} {'ciclos':>8} {'acessos':>8} {'paradas':>8} {'IPC':>6}")
+    for core, (record, name) in enumerate(zip(result['cores'], names)):
+        if record['halted']:
+            ipc = record['instructions'] / record['cycles'] if record['cycles'] else 0.0
+            print(f"{core:>6} {name:20} {record['instructions']:>10} {record['cycles']:>8} "
+                  f"{record['accesses']:>8} {record['stalls']:>8} {ipc:>6.2f}")
+        else:
+            print(f"{core:>6} {name:20} {'-':>10} {record['cycles']:>8} "
+                  f"{record['accesses']:>8} {record['stalls']:>8} {'-':>6}")
+    if not result['halted']:
+        print(f"Limite de {result['cycles']} ciclos atingido antes do fim dos programas")
+        return
+    print(f"Total: {result['instructions']} instruções em {result['cycles']} ciclos, "
+          f"IPC agregado {result['ipc']:.3f}")
+    print(f"Ciclos de parada no barramento: {result['stalls']} ({result['policy']})")
+    print(f"Tempo: {result['seconds']:.3f} s")
+
+
+def main():
+    """Run programs on a multi-core system from the command line."""
+    parser = argparse.ArgumentParser(description="Simula um Maua-V com vários núcleos e memória compartilhada.")
+    parser.add_argument("programs", nargs="+", help="programa de cada núcleo (texto ou .bin)")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="número de núcleos; os programas se repetem em ordem (padrão: um por programa)")
+    parser.add_argument("--policy", choices=POLICIES, default="round-robin", help="política do árbitro do barramento")
+    parser.add_argument("--max-cycles", type=int, default=None, help="número máximo de ciclos de clock")
+    parser.add_argument("--scaling", action="store_true",
+                        help="roda com 1, 2, ... núcleos e mostra como o IPC agregado cresce")
+    args = parser.parse_args()
+    count = len(args.programs) if args.cores is None else args.cores
+    if count < 1:
+        parser.error("--cores precisa ser pelo menos 1")
+
+    loaded = [Program.load(filename) for filename in args.programs]
+    for filename, program in zip(args.programs, loaded):
+        if Branch.moves(program):
+            parser.error(f"{filename}: um núcleo do MultiCore não executa cópias em bloco")
+    names = [args.programs[core % len(args.programs)] for core in range(count)]
+    programs = [loaded[core % len(loaded)] for core in range(count)]
+    if not args.scaling:
+        result = simulate(programs, args.policy, args.max_cycles)
+        report(result, names)
+        return 0 if result['halted'] else 1
+
+    print(f"{'núcleos':>7} {'instruções':>10} {'ciclos':>8} {'paradas':>8} {'IPC':>6} {'ganho':>6}")
+    base = None
+    for cores in range(1, count + 1):
+        result = simulate(programs[:cores], args.policy, args.max_cycles)
+        if not result['halted']:
+            print(f"{cores:>7} limite de {result['cycles']} ciclos atingido")
+            return 1
+        if base is None:
+            base = result['ipc']
+        gain = result['ipc'] / base if base else 0.0
+        print(f"{cores:>7} {result['instructions']:>10} {result['cycles']:>8} {result['stalls']:>8} "
+              f"{result['ipc']:>6.3f} {gain:>6.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,291 @@
+"""Pipelined control unit for the Maua-V processor.
+
+``CPU.system()`` runs one instruction at a time: UC walks through every
+micro-step of an instruction before it fetches the next one. The system
+below overlaps instructions in four stages, each a clocked block separated
+from the next by a pipeline register:
+
+- fetch (IF) reads the next record of the decoded program;
+- decode (ID) works out how many cycles the instruction needs in EX;
+- execute (EX) reads the operands and computes the words to write;
+- writeback (WB) commits one register or memory write per cycle.
+
+Operands are read in EX. A write still waiting in the EX/WB register is
+forwarded to EX, so back-to-back dependent instructions do not stall. The
+hazard unit only stalls for the ports: memory has one read port and the
+register file two, so M.M. stays three cycles in EX and M.R. two, and the
+single write port of WB takes one cycle per word M.M./M.R. write.
+
+Each instruction has the same effect as in the serial UC, including the
+order of the three moves of M.M./M.R. and the operands the ALU sees on the
+way, so both control units end with the same registers and memory.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from myhdl import block, Signal, intbv, always, always_comb, delay, now, StopSimulation
+
+import Branch
+import CPU
+import FastCPU
+import Program
+
+# Storage a write goes to, in the (storage, address, value) writes of EX/WB.
+REGISTER, MEMORY = range(2)
+
+REGISTER_READ_PORTS = 2
+MEMORY_READ_PORTS = 1
+
+# Operand reads each opcode makes in EX: (register reads, memory reads).
+READS = {
+    0: (0, 0),
+    1: (0, 0),
+    2: (2, 0),
+    3: (0, 3),
+    4: (3, 0),
+    5: (1, 0),
+    6: (0, 1),
+    7: (0, 0),
+}
+
+# Cycles each opcode spends in EX with the read ports above.
+EX_CYCLES = {
+    opcode: max(1, -(-registers // REGISTER_READ_PORTS), -(-words // MEMORY_READ_PORTS))
+    for opcode, (registers, words) in READS.items()
+}
+
+
+def _move(read, storage, a, b, c):
+    """Writes of the three moves UC makes for M.M. and M.R., in order."""
+    values = {}
+
+    def get(address):
+        return values[address] if address in values else read(storage, address)
+
+    saved = get(b)
+    values[b] = get(a)
+    values[a] = get(c)
+    values[c] = get(b)
+    values[b] = saved
+    return tuple((storage, address, value) for address, value in values.items())
+
+
+def execute(instruction, read, alu_state):
+    """Return the writes of a decoded instruction and the new ALU registers.
+
+    read(storage, address) returns an operand, forwarded when needed;
+    alu_state is (operation, num1, num2, result, vnum1, vnum2, vresult) as
+    left by the last A.L.O.
+    """
+    def scalar(storage, address):
+        # Only the low lane of a register goes through the 8-bit data path
+        return read(storage, address) & FastCPU.READ_MASK
+
+    opcode, f0, f1, f2, f3 = instruction[:Program.RECORD]
+    if opcode == 0:
+        return ((MEMORY, f0, f1),), alu_state
+    if opcode == 1:
+        return ((REGISTER, f0, f1),), alu_state
+    if opcode == 2 and f2 >= Program.VECTOR:
+        # The same three evaluations on the vector path, with whole
+        # registers; num1, num2 and result stay as they are.
+        operation, num1, num2, result, vnum1, vnum2, vresult = alu_state
+        a = read(REGISTER, f0)
+        b = read(REGISTER, f1)
+        vresult = FastCPU.valu(operation, a, vnum2, vresult)
+        vresult = FastCPU.valu(operation, a, b, vresult)
+        vresult = FastCPU.valu(f2, a, b, vresult)
+        return ((REGISTER, f3, vresult),), (f2, num1, num2, result, a, b, vresult)
+    if opcode == 2:
+        # UC loads num1, then num2, then the operation, and the clocked ALU
+        # computes a result after each of them.
+        operation, num1, num2, result, vnum1, vnum2, vresult = alu_state
+        a = scalar(REGISTER, f0)
+        b = scalar(REGISTER, f1)
+        result = FastCPU.alu(operation, a, num2, result)
+        result = FastCPU.alu(operation, a, b, result)
+        result = FastCPU.alu(f2, a, b, result)
+        value = FastCPU._check(result, 1 << 8)
+        return ((REGISTER, f3, value),), (f2, a, b, result, vnum1, vnum2, vresult)
+    if opcode == 3:
+        return _move(scalar, MEMORY, f0, f1, f2), alu_state
+    if opcode == 4:
+        return _move(scalar, REGISTER, f0, f1, f2), alu_state
+    if opcode == 5:
+        return ((MEMORY, f1, scalar(REGISTER, f0)),), alu_state
+    if opcode == 6:
+        return ((REGISTER, f1, scalar(MEMORY, f0)),), alu_state
+    return ((REGISTER, f0, 0),), alu_state
+
+
+@block
+def pipelined_system(program, state=None, verbose=True):
+    # program: decoded instructions from Program.load() or Program.decode()
+    # state: optional dict that receives the final registers and memory, the
+    #        cycle and instruction counts and the stall and forward counters
+    # verbose: print the register and memory dump like CPU.system()
+
+    if Branch.used(program):
+        raise ValueError("A UC em pipeline não executa comparações, desvios e cópias em bloco")
+    clk = Signal(bool(0))
+    regs = [Signal(intbv(0)[32:]) for i in range(32)]
+    mem = [Signal(intbv(0)[10:]) for i in range(256)]
+    count = Program.length(program)
+
+    # Pipeline registers; an empty tuple is a bubble
+    pc = Signal(0)
+    if_id = Signal(())
+    id_ex = Signal(())
+    ex_wb = Signal(())
+    ex_cycle = Signal(0)
+    alu_state = Signal((0, 0, 0, 0, 0, 0, 0))
+
+    # Hazard unit outputs
+    ex_done = Signal(bool(0))
+    ex_free = Signal(bool(0))
+    id_free = Signal(bool(0))
+
+    counters = {'stalls': 0, 'forwards': 0}
+
+    @always(delay(CPU.CLOCK_PERIOD // 2))
+    def clkgen():
+        clk.next = not clk
+
+    @always_comb
+    def hazard():
+        # EX finishes once its reads are done and WB is left with at most
+        # the write it commits on this edge
+        done = bool(id_ex.val) and ex_cycle + 1 >= id_ex.val[-1] and len(ex_wb.val) <= 1
+        ex_done.next = done
+        ex_free.next = done or not id_ex.val
+        id_free.next = done or not id_ex.val or not if_id.val
+
+    @always(clk.posedge)
+    def fetch():
+        if id_free:
+            if pc < count:
+                if_id.next = Program.instruction(program, pc)
+                pc.next = pc + 1
+            else:
+                if_id.next = ()
+        elif if_id.val:
+            counters['stalls'] += 1
+
+    @always(clk.posedge)
+    def decode():
+        if ex_free:
+            if if_id.val:
+                id_ex.next = if_id.val + (EX_CYCLES[if_id.val[0]],)
+            else:
+                id_ex.next = ()
+
+    @always(clk.posedge)
+    def ex():
+        pending = ex_wb.val
+        if ex_done:
+            def read(storage, address):
+                for target, where, value in reversed(pending):
+                    if target == storage and where == address:
+                        counters['forwards'] += 1
+                        return value
+                return int((regs if storage == REGISTER else mem)[address])
+
+            writes, alu_next = execute(id_ex.val, read, alu_state.val)
+            ex_wb.next = writes
+            alu_state.next = alu_next
+            ex_cycle.next = 0
+        else:
+            ex_wb.next = pending[1:]
+            ex_cycle.next = ex_cycle + 1 if id_ex.val else 0
+
+    @always(clk.posedge)
+    def wb():
+        if ex_wb.val:
+            storage, address, value = ex_wb.val[0]
+            (regs if storage == REGISTER else mem)[address].next = value
+
+    @always(clk.posedge)
+    def halt():
+        if pc >= count and not (if_id.val or id_ex.val or ex_wb.val):
+            registers = [int(r) for r in regs]
+            memory = [int(m) for m in mem]
+            if verbose:
+                print(FastCPU.dump_text(registers, memory), end="")
+            if state is not None:
+                state['registers'] = registers
+                state['memory'] = memory
+                # The last write was committed on the previous edge
+                state['cycles'] = (now() + CPU.CLOCK_PERIOD // 2) // CPU.CLOCK_PERIOD - 1
+                state['program_cycles'] = state['cycles']
+                state['instructions'] = count
+                state.update(counters)
+                state['halted'] = True
+            raise StopSimulation("pipeline terminou o programa")
+
+    return clkgen, hazard, fetch, decode, ex, wb, halt
+
+
+def simulate(program, max_cycles=None, verbose=True):
+    """Run a program on the pipelined system; returns a state like CPU.simulate()."""
+    state = {'halted': False}
+    tb = pipelined_system(program, state, verbose)
+    start = time.perf_counter()
+    try:
+        if max_cycles is None:
+            tb.run_sim(quiet=1)
+        else:
+            tb.run_sim(max_cycles * CPU.CLOCK_PERIOD, quiet=1)
+    finally:
+        state['seconds'] = time.perf_counter() - start
+        tb.quit_sim()
+    if not state['halted']:
+        state['cycles'] = max_cycles
+    return state
+
+
+def compare(serial, pipelined):
+    """Return the differences between the final registers and memory of two runs."""
+    differences = []
+    for name in ('registers', 'memory'):
+        for i, (a, b) in enumerate(zip(serial[name], pipelined[name])):
+            if a != b:
+                differences.append(f"{name} {i}: serial={a} pipeline={b}")
+    return differences
+
+
+def cpi(state):
+    """Return the clock cycles per instruction of a run, without the final dump."""
+    if not state['instructions']:
+        return 0.0
+    return state['program_cycles'] / state['instructions']
+
+
+def main():
+    """Run a program on both control units and compare final state and CPI."""
+    parser = argparse.ArgumentParser(description="Compara a UC serial com a UC em pipeline.")
+    parser.add_argument("file", nargs="?", default="bits.txt", help="arquivo do programa (padrão: bits.txt)")
+    args = parser.parse_args()
+
+    program = Program.load(args.file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = CPU.simulate(program)
+    pipelined = simulate(program)
+
+    print()
+    print(f"{'':10} {'ciclos':>10} {'CPI':>6}")
+    for name, state in (('serial', serial), ('pipeline', pipelined)):
+        print(f"{name:10} {state['program_cycles']:>10} {cpi(state):>6.2f}")
+    print(f"Paradas: {pipelined['stalls']}, adiantamentos: {pipelined['forwards']}")
+
+    differences = compare(serial, pipelined)
+    for difference in differences:
+        print(difference)
+    print("Estado final idêntico" if not differences else f"{len(differences)} diferenças")
+    return 0 if not differences else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
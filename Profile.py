@@ -0,0 +1,145 @@
+"""Cycle profiling and access counters for ``CPU.system()``.
+
+A profile is a plain, JSON-ready dict filled while the MyHDL model runs:
+
+- ``opcodes``: instructions executed and clock cycles spent, per opcode;
+- ``instructions``: clock cycles spent by each instruction, by index;
+- ``alu``: evaluations of ``ALU.alu_logic`` per operation code, counted on
+  the edges UC enables it;
+- ``registers`` and ``memory``: reads and writes per address, counted in
+  the read and write processes of ``register`` and ``memory``; a read is
+  counted when the read port moves to another address or, for memory,
+  reads again after a write, not on every wake-up of the process;
+- ``seconds``: wall time of the run, the part spent in UC's own Python code
+  and the rest, spent in the MyHDL kernel and the other blocks.
+
+Instrumentation is off unless a profile is passed to ``CPU.simulate()``.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import Program
+
+ALU_OPERATIONS = 32
+
+
+def new_profile(program, geometry=Program.DEFAULT):
+    """Return an empty profile for a decoded program."""
+    registers = geometry['register_count']
+    words = geometry['memory_size']
+    return {
+        'opcodes': {name: {'count': 0, 'cycles': 0}
+                    for name in list(Program.NAMES.values()) + list(Program.FUNCTIONS.values())[1:]},
+        'instructions': [0] * Program.length(program),
+        'alu': [0] * ALU_OPERATIONS,
+        'registers': {'reads': [0] * registers, 'writes': [0] * registers},
+        'memory': {'reads': [0] * words, 'writes': [0] * words},
+        'seconds': {'total': 0.0, 'uc': 0.0, 'kernel': 0.0},
+        'cycles': 0,
+    }
+
+
+def record(profile, index, opcode, cycles, function=0):
+    """Account the clock cycles instruction ``index`` took; a loop adds them up."""
+    name = Program.FUNCTIONS.get(function, Program.NAMES[opcode]) if opcode == 7 else Program.NAMES[opcode]
+    entry = profile['opcodes'][name]
+    entry['count'] += 1
+    entry['cycles'] += cycles
+    profile['instructions'][index] += cycles
+
+
+def timed(steps, seconds, key):
+    """Run a generator, adding the time spent inside it to ``seconds[key]``."""
+    while True:
+        start = time.perf_counter()
+        try:
+            trigger = next(steps)
+        except StopIteration:
+            return
+        finally:
+            seconds[key] += time.perf_counter() - start
+        yield trigger
+
+
+def finish(profile, seconds, cycles):
+    """Record the wall time and the clock cycles of the finished run."""
+    profile['seconds']['total'] = seconds
+    profile['seconds']['kernel'] = seconds - profile['seconds']['uc']
+    profile['cycles'] = cycles
+
+
+def _top(counts, top):
+    """Return the (key, count) pairs with the largest non-zero counts."""
+    items = counts.items() if isinstance(counts, dict) else enumerate(counts)
+    return sorted(((key, count) for key, count in items if count), key=lambda item: -item[1])[:top]
+
+
+def report(profile, top=10):
+    """Return the hot spots of a profile as lines of text."""
+    cycles = profile['cycles'] or 1
+    lines = ["Ciclos por opcode:"]
+    opcodes = {name: entry['cycles'] for name, entry in profile['opcodes'].items()}
+    for name, spent in _top(opcodes, top):
+        count = profile['opcodes'][name]['count']
+        lines.append(f"  {name:8} {count:>10} instr {spent:>12} ciclos {100 * spent / cycles:6.1f}%")
+    program = sum(opcodes.values())
+    lines.append(f"  {'dump':8} {'':>16} {profile['cycles'] - program:>12} ciclos")
+
+    lines.append(f"\nInstruções mais caras (top {top}):")
+    for index, spent in _top(profile['instructions'], top):
+        lines.append(f"  #{index:<10} {spent:>6} ciclos")
+
+    lines.append("\nOperações da ALU:")
+    for operation, count in _top(profile['alu'], top):
+        lines.append(f"  op {operation:<6} {count:>12}")
+
+    for title, name in (("Registradores", 'registers'), ("Endereços de memória", 'memory')):
+        counters = profile[name]
+        accesses = [r + w for r, w in zip(counters['reads'], counters['writes'])]
+        lines.append(f"\n{title} mais acessados (leituras/escritas):")
+        for address, _ in _top(accesses, top):
+            lines.append(f"  {address:<8} {counters['reads'][address]:>12} {counters['writes'][address]:>12}")
+
+    seconds = profile['seconds']
+    total = seconds['total'] or 1
+    lines.append("\nTempo:")
+    lines.append(f"  total   {seconds['total']:10.3f} s")
+    lines.append(f"  UC      {seconds['uc']:10.3f} s {100 * seconds['uc'] / total:6.1f}%")
+    lines.append(f"  kernel  {seconds['kernel']:10.3f} s {100 * seconds['kernel'] / total:6.1f}%")
+    return lines
+
+
+def write_json(profile, filename):
+    """Write a profile to a JSON file."""
+    with open(filename, 'w') as file:
+        json.dump(profile, file, indent=1)
+
+
+def main():
+    """Profile a program on the MyHDL model and print its hot spots."""
+    import CPU
+
+    parser = argparse.ArgumentParser(description="Perfil de ciclos e acessos de um programa Maua-V.")
+    parser.add_argument("file", nargs="?", default="bits.txt", help="arquivo do programa (padrão: bits.txt)")
+    parser.add_argument("-o", "--output", default=None, help="grava o perfil completo em JSON")
+    parser.add_argument("--top", type=int, default=10, help="itens mostrados em cada lista")
+    args = parser.parse_args()
+
+    program = Program.load(args.file)
+    profile = new_profile(program)
+    with contextlib.redirect_stdout(io.StringIO()):
+        CPU.simulate(program, profile=profile)
+
+    for line in report(profile, args.top):
+        print(line)
+    if args.output:
+        write_json(profile, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,418 @@
+"""Loading, pre-decoding and storage of Maua-V programs.
+
+A program is decoded once into a packed ``array('B')`` with one fixed-size
+record per instruction: the opcode followed by up to four operand fields,
+already converted to integers. The control unit then walks the records with
+a program counter instead of slicing the text of each line again.
+
+Programs are stored either as text, one line of '0'/'1' characters per
+instruction, or in the packed binary format: a 12-byte header (magic
+``MAUA``, format version and instruction count, little-endian) followed by
+one little-endian uint32 word per instruction. The first character of a
+text line is the most significant bit of its word.
+
+The sizes of the machine (memory words, registers, bits per word) are a
+geometry, from geometry(). The default machine uses the 32-bit FIELDS
+layout. Any other machine uses the packed layout that encoder V2.py
+writes: the operands follow the opcode in COLUMNS order, and each one is
+as wide as an address, a register number, a word or an operation code.
+Those words are 32 bits when they fit, 64 bits otherwise; 64-bit programs
+use version 2 of the binary format, with uint64 words.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from itertools import islice
+
+# Bytes per decoded instruction: opcode and four operand fields.
+RECORD = 5
+
+# Bit slices of the instruction line read by UC for each opcode.
+FIELDS = {
+    0: ((4, 11), (12, 19)),                    # W.M.: address, value
+    1: ((4, 8), (9, 16)),                      # W.R.: register, value
+    2: ((4, 8), (14, 18), (8, 13), (19, 23)),  # A.L.O.: reg1, reg2, operation, destination
+    3: ((4, 8), (9, 13), (14, 18)),            # M.M.: base, aux, destination
+    4: ((4, 8), (9, 13), (14, 18)),            # M.R.: base, aux, destination
+    5: ((4, 8), (9, 16)),                      # M.R.M.: register, address
+    6: ((4, 11), (12, 16)),                    # M.M.R.: address, register
+    7: ((4, 8), (8, 11), (12, 16), (16, 24)),  # R.R./branches: register, function, register 2, offset
+}
+
+# Short names of the opcodes, as used by encoder V2.py.
+NAMES = {
+    0: 'W.M.',    # Write in Memory
+    1: 'W.R.',    # Write in Registers
+    2: 'A.L.O.',  # ALU operation
+    3: 'M.M.',    # Move in memory
+    4: 'M.R.',    # Move in registers
+    5: 'M.R.M.',  # Move Registers to Memory
+    6: 'M.M.R.',  # Move Memory to Register
+    7: 'R.R.',    # Remove Register
+}
+
+# Functions of opcode 7 (field 1). Function 0 is R.R., which leaves the
+# other fields zero; the others compare two registers, branch by a
+# signed offset (see Branch.py) or copy a block of memory words.
+FUNCTIONS = {
+    0: 'R.R.',    # Remove Register
+    1: 'C.M.P.',  # Compare registers
+    2: 'J.M.P.',  # Jump
+    3: 'B.E.Q.',  # Branch if equal
+    4: 'B.N.E.',  # Branch if not equal
+    5: 'B.L.T.',  # Branch if less than
+    6: 'B.G.E.',  # Branch if greater or equal
+    7: 'B.M.',    # Block move
+}
+
+# Operands of each opcode in the column order of the packed layout, as
+# (index in FIELDS order, kind); encoder V2.py writes them in this order.
+COLUMNS = {
+    0: ((0, 'address'), (1, 'value')),
+    1: ((0, 'register'), (1, 'value')),
+    2: ((0, 'register'), (2, 'operation'), (1, 'register'), (3, 'register')),
+    3: ((0, 'address'), (1, 'address'), (2, 'address')),
+    4: ((0, 'register'), (1, 'register'), (2, 'register')),
+    5: ((0, 'register'), (1, 'address')),
+    6: ((0, 'address'), (1, 'register')),
+    7: ((0, 'register'), (1, 'function'), (2, 'register'), (3, 'offset')),
+}
+
+# Default machine: 256 memory words and 32 registers, 8-bit data path.
+MEMORY_SIZE = 256
+REGISTER_COUNT = 32
+WORD_WIDTH = 8
+MAX_WORD_WIDTH = 16
+OPERATION_BITS = 5
+FUNCTION_BITS = 3
+OFFSET_BITS = 8
+
+# A.L.O. operation codes from VECTOR up are vector operations: they work on
+# whole 32-bit registers as LANES packed lanes of LANE_BITS bits each.
+VECTOR = 16
+LANES = 4
+LANE_BITS = 8
+
+MAGIC = b'MAUA'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+WORD_BITS = 32
+
+# array typecode of an unsigned 32-bit word on this platform.
+WORD = 'I' if array('I').itemsize == 4 else 'L'
+
+# array typecode and binary format version of each instruction word size.
+WORDS = {32: WORD, 64: 'Q'}
+VERSIONS = {32: VERSION, 64: 2}
+
+
+def typecode(bits):
+    """Return the smallest unsigned array typecode holding ``bits`` bits."""
+    for code in ('B', 'H', WORD, 'Q'):
+        if bits <= 8 * array(code).itemsize:
+            return code
+    raise ValueError(f"Nenhum tipo de array comporta {bits} bits")
+
+
+def _shifts(fields, word_bits):
+    """Return (shift, mask) pairs extracting the given fields from a word."""
+    return tuple((word_bits - b, (1 << (b - a)) - 1) for a, b in fields)
+
+
+SHIFTS = {opcode: _shifts(FIELDS[opcode], WORD_BITS) for opcode in FIELDS}
+
+
+def _packed(widths):
+    """Return the packed layout for the given field widths and its word size."""
+    fields = {}
+    size = 0
+    for opcode, columns in COLUMNS.items():
+        slices = [None] * len(columns)
+        start = 3
+        for index, kind in columns:
+            slices[index] = (start, start + widths[kind])
+            start += widths[kind]
+        fields[opcode] = tuple(slices)
+        size = max(size, start)
+    for word_bits in sorted(WORDS):
+        if size <= word_bits:
+            return fields, word_bits
+    raise ValueError(f"As instruções precisariam de {size} bits; o máximo é {max(WORDS)}")
+
+
+def geometry(memory_size=MEMORY_SIZE, register_count=REGISTER_COUNT, word_width=WORD_WIDTH):
+    """Return the sizes, Signal widths and instruction layout of a machine.
+
+    word_width is the width of the data path and of the memory words;
+    registers stay 32 bits wide and ALU results ``word_width + 6`` bits.
+    """
+    if memory_size < 1 or register_count < 1:
+        raise ValueError("A memória e o banco de registradores precisam de ao menos uma palavra")
+    if not 1 <= word_width <= MAX_WORD_WIDTH:
+        raise ValueError(f"A largura da palavra deve ficar entre 1 e {MAX_WORD_WIDTH} bits")
+    widths = {
+        'address': max(1, (memory_size - 1).bit_length()),
+        'register': max(1, (register_count - 1).bit_length()),
+        'value': word_width,
+        'operation': OPERATION_BITS,
+        'function': FUNCTION_BITS,
+        'offset': OFFSET_BITS,
+    }
+    if (memory_size, register_count, word_width) == (MEMORY_SIZE, REGISTER_COUNT, WORD_WIDTH):
+        fields, word_bits = FIELDS, WORD_BITS
+    else:
+        fields, word_bits = _packed(widths)
+    return {
+        'memory_size': memory_size,
+        'register_count': register_count,
+        'word_width': word_width,
+        'address_bits': widths['address'],
+        'register_bits': widths['register'],
+        'result_bits': word_width + 6,
+        'fields': fields,
+        'word_bits': word_bits,
+        'shifts': {opcode: _shifts(fields[opcode], word_bits) for opcode in fields},
+        # typecode of the decoded records, wide enough for every field
+        'record': typecode(max(b - a for slices in fields.values() for a, b in slices)),
+    }
+
+
+DEFAULT = geometry()
+
+
+def words_from_lines(bits, word_bits=WORD_BITS):
+    """Convert instruction lines into an array of words of ``word_bits`` bits.
+
+    Only the first ``word_bits`` characters of each line are kept. The
+    conversion is done on the whole program at once, through a single integer.
+    """
+    for linha in bits:
+        if len(linha) < word_bits:
+            raise ValueError(f"Todas as intruções tem que ter no mínimo {word_bits} bits")
+    words = array(WORDS[word_bits])
+    if not bits:
+        return words
+    text = ''.join(linha[:word_bits] for linha in bits)
+    words.frombytes(int(text, 2).to_bytes(word_bits // 8 * len(bits), 'big'))
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+
+def lines_from_words(words, word_bits=WORD_BITS):
+    """Convert words of ``word_bits`` bits back into instruction lines, all at once."""
+    if not len(words):
+        return []
+    data = array(WORDS[word_bits], words)
+    if sys.byteorder == 'little':
+        data.byteswap()
+    text = format(int.from_bytes(data.tobytes(), 'big'), f'0{word_bits * len(data)}b')
+    return [text[i:i + word_bits] for i in range(0, len(text), word_bits)]
+
+
+def decode_words(words, geometry=DEFAULT):
+    """Decode instruction words into a packed program array."""
+    program = array(geometry['record'])
+    top = geometry['word_bits'] - 3
+    shifts = geometry['shifts']
+    for word in words:
+        opcode = word >> top
+        fields = [(word >> shift) & mask for shift, mask in shifts[opcode]]
+        program.append(opcode)
+        program.extend(fields + [0] * (RECORD - 1 - len(fields)))
+    return program
+
+
+def encode(opcode, fields, geometry=DEFAULT):
+    """Encode an opcode and its operand fields into an instruction word."""
+    word_bits = geometry['word_bits']
+    word = opcode << (word_bits - 3)
+    for (a, b), value in zip(geometry['fields'][opcode], fields):
+        if not 0 <= value < 1 << (b - a):
+            raise ValueError(f"Campo [{a}:{b}] não comporta o valor {value}")
+        word |= value << (word_bits - b)
+    return word
+
+
+def decode(bits, geometry=DEFAULT):
+    """Decode instruction lines into a packed program array."""
+    return decode_words(words_from_lines(bits, geometry['word_bits']), geometry)
+
+
+def read_lines(filename="bits.txt"):
+    """Read the instruction lines of a text program file."""
+    with open(filename, 'r') as file:
+        return [linha.strip() for linha in file]
+
+
+def write_lines(filename, bits):
+    """Write instruction lines to a text program file."""
+    with open(filename, 'w') as file:
+        if bits:
+            file.write('\n'.join(bits) + '\n')
+
+
+def is_binary(filename):
+    """Tell whether a file is in the packed binary program format."""
+    with open(filename, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_binary(filename):
+    """Map a packed binary program file and return its words.
+
+    Version 1 files hold 32-bit words and version 2 files 64-bit words. On
+    little-endian machines the words are a memoryview straight into the
+    memory-mapped file, so nothing is copied.
+    """
+    with open(filename, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < HEADER.size:
+        raise ValueError(f"{filename}: arquivo binário sem cabeçalho")
+    magic, version, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{filename}: não é um programa binário Maua-V")
+    word_bits = next((bits for bits, number in VERSIONS.items() if number == version), None)
+    if word_bits is None:
+        raise ValueError(f"{filename}: versão {version} do formato não suportada")
+    if len(buffer) != HEADER.size + word_bits // 8 * count:
+        raise ValueError(f"{filename}: esperadas {count} instruções")
+    words = memoryview(buffer)[HEADER.size:].cast(WORDS[word_bits])
+    if sys.byteorder == 'big':
+        words = array(WORDS[word_bits], words)
+        words.byteswap()
+    return words
+
+
+def write_binary(filename, words, word_bits=WORD_BITS):
+    """Write words of ``word_bits`` bits to a packed binary program file."""
+    data = array(WORDS[word_bits], words)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSIONS[word_bits], len(data)))
+        data.tofile(file)
+
+
+def read_words(filename, word_bits=WORD_BITS):
+    """Read the instruction words of a program file in either format."""
+    if is_binary(filename):
+        words = read_binary(filename)
+        if 8 * words.itemsize != word_bits:
+            raise ValueError(f"{filename}: instruções de {8 * words.itemsize} bits, esperadas de {word_bits}")
+        return words
+    return words_from_lines(read_lines(filename), word_bits)
+
+
+def write_words(filename, words, word_bits=WORD_BITS):
+    """Write instruction words, in binary format when the file ends in ``.bin``."""
+    if filename.endswith('.bin'):
+        write_binary(filename, words, word_bits)
+    else:
+        write_lines(filename, lines_from_words(words, word_bits))
+
+
+# Per bit of a byte, the table translating each byte to the character of that bit.
+_BIT_CHARS = [bytes(ord('0') + (byte >> bit & 1) for byte in range(256)) for bit in range(8)]
+
+
+def _write_chunk(file, words, binary, word_bits):
+    """Write one chunk of words to an open program file."""
+    if binary:
+        if sys.byteorder == 'big':
+            words.byteswap()
+        words.tofile(file)
+    else:
+        # One text column per bit: the bytes holding it, translated to
+        # '0'/'1' and copied with a stride of a line
+        if sys.byteorder == 'little':
+            words.byteswap()
+        data = words.tobytes()
+        size = words.itemsize
+        lines = bytearray(b'\n' * (len(words) * (word_bits + 1)))
+        for byte in range(size):
+            column = data[byte::size]
+            for bit in range(8):
+                lines[8 * byte + 7 - bit::word_bits + 1] = column.translate(_BIT_CHARS[bit])
+        file.write(lines)
+
+
+def stream_chunks(filename, chunks, word_bits=WORD_BITS):
+    """Write chunks of words as they come and return how many words there were.
+
+    Each chunk is an array of words of ``word_bits`` bits, or any other
+    buffer of them in native byte order, such as a NumPy array. The format
+    follows the extension like write_words(); the instruction count of the
+    binary header is filled in once the chunks are exhausted.
+    """
+    binary = filename.endswith('.bin')
+    version = VERSIONS[word_bits]
+    count = 0
+    with open(filename, 'wb') as file:
+        if binary:
+            file.write(HEADER.pack(MAGIC, version, 0))
+        for chunk in chunks:
+            words = array(WORDS[word_bits])
+            words.frombytes(memoryview(chunk).cast('B'))
+            _write_chunk(file, words, binary, word_bits)
+            count += len(words)
+        if binary:
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, version, count))
+    return count
+
+
+def stream_words(filename, words, chunk_size=1 << 16, word_bits=WORD_BITS):
+    """Write words from an iterable as they come and return how many there were.
+
+    The words are grouped into chunks of ``chunk_size`` for stream_chunks().
+    """
+    words = iter(words)
+    chunks = iter(lambda: array(WORDS[word_bits], islice(words, chunk_size)), array(WORDS[word_bits]))
+    return stream_chunks(filename, chunks, word_bits)
+
+
+def load(filename="bits.txt", geometry=DEFAULT):
+    """Read and decode a program file in either format."""
+    return decode_words(read_words(filename, geometry['word_bits']), geometry)
+
+
+def convert(source, destination, word_bits=WORD_BITS):
+    """Convert a program file between the text and the binary format.
+
+    The format of ``destination`` follows its extension (``.bin`` or text).
+    """
+    words = read_words(source, word_bits)
+    write_words(destination, words, word_bits)
+    return len(words)
+
+
+def length(program):
+    """Return the number of instructions in a decoded program."""
+    return len(program) // RECORD
+
+
+def instruction(program, pc):
+    """Return the opcode and the four fields of instruction ``pc``."""
+    base = pc * RECORD
+    return tuple(program[base:base + RECORD])
+
+
+def main():
+    """Convert a program file given on the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Converte programas Maua-V entre texto e binário (.bin).")
+    parser.add_argument("source", help="programa de entrada (texto ou .bin)")
+    parser.add_argument("destination", help="programa de saída; .bin grava o formato binário")
+    parser.add_argument("--word-bits", type=int, choices=sorted(WORDS), default=WORD_BITS,
+                        help="bits por instrução (64 nas máquinas de memória grande)")
+    args = parser.parse_args()
+    count = convert(args.source, args.destination, args.word_bits)
+    print(f"{count} instruções gravadas em {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
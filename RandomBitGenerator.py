@@ -1,4 +1,50 @@
+import argparse
 import random
+import sys
+
+import numpy as np
+
+import Program
+
+# ALU operations as (funct3, funct7) pairs
+ALU_OPERATIONS = [
+    ('000', '0000000'),  # Addition
+    ('000', '0100000'),  # Subtraction
+    ('001', '0000000'),  # Multiplication
+    ('001', '0100000'),  # Division
+    ('111', '0000000'),  # AND
+    ('110', '0000000'),  # OR
+    ('100', '0000000'),  # XOR
+    ('101', '0000000')   # NOT
+]
+
+# Vector ALU instructions are A.L.O. words (opcode 2) carrying one of the
+# operations on the packed 8-bit lanes of a register
+VECTOR_OPERATIONS = tuple(range(Program.VECTOR, Program.VECTOR + 7))
+
+# Instruction classes in the order main() generates them, with their 3-bit prefix
+CLASSES = {
+    'write_mem': 0b000,
+    'write_reg': 0b001,
+    'move_mem': 0b010,
+    'move_reg': 0b011,
+    'alu': 0b100,
+    'vector_alu': 0b010,
+}
+
+CHUNK_SIZE = 1 << 20
+
+# Random bits kept by each class: all but the prefix, or for ALU instructions
+# everything outside the prefix, funct3 and funct7 (binary[3:10] and binary[13:25]),
+# or for vector ALU instructions everything outside the opcode and the operation
+ALU_KEEP = (((1 << 7) - 1) << 22) | (((1 << 12) - 1) << 7)
+VECTOR_KEEP = ((1 << 29) - 1) & ~Program.encode(2, [0, 0, (1 << Program.OPERATION_BITS) - 1, 0])
+KEEP_MASKS = np.array([(1 << 29) - 1] * 4 + [ALU_KEEP, VECTOR_KEEP], dtype=np.uint32)
+PREFIXES = np.array([prefix << 29 for prefix in CLASSES.values()], dtype=np.uint32)
+ALU_BITS = np.array([(int(funct3, 2) << 19) | int(funct7, 2) for funct3, funct7 in ALU_OPERATIONS],
+                    dtype=np.uint32)
+VECTOR_BITS = np.array([Program.encode(2, [0, 0, operation, 0]) for operation in VECTOR_OPERATIONS],
+                       dtype=np.uint32)
 
 def set_write_mode(binary, sub_mode):
     """Set the first 3 bits to '000' for Write to Memory or '001' for Write to Registry."""
@@ -16,21 +62,16 @@ def set_alu_mode(binary, funct3, funct7):
     """
     return '100' + binary[3:10] + funct3.zfill(3) + binary[13:25] + funct7.zfill(7)
 
+def set_vector_mode(binary, operation):
+    """Make the binary an A.L.O. instruction ('010') with the given vector operation."""
+    word = (int(binary, 2) & VECTOR_KEEP) | Program.encode(2, [0, 0, operation, 0])
+    return f'{word:032b}'
+
 def random_alu_operation():
     """
     Selects a random ALU operation and returns the corresponding funct3 and funct7 values.
     """
-    operation_map = [
-        ('000', '0000000'),  # Addition
-        ('000', '0100000'),  # Subtraction
-        ('001', '0000000'),  # Multiplication
-        ('001', '0100000'),  # Division
-        ('111', '0000000'),  # AND
-        ('110', '0000000'),  # OR
-        ('100', '0000000'),  # XOR
-        ('101', '0000000')   # NOT
-    ]
-    return random.choice(operation_map)
+    return random.choice(ALU_OPERATIONS)
 
 def generate_32bit_binaries(count, mode, sub_mode=None):
     """
@@ -50,17 +91,78 @@ def generate_32bit_binaries(count, mode, sub_mode=None):
         elif mode == 'alu':
             funct3, funct7 = random_alu_operation()  # Randomly select ALU operation
             binary_number = set_alu_mode(binary_number, funct3, funct7)
+        elif mode == 'vector_alu':
+            binary_number = set_vector_mode(binary_number, random.choice(VECTOR_OPERATIONS))
         
         binaries.append(binary_number)
     return binaries
 
 def save_to_file(binaries, filename="bits.txt"):
-    """Save the generated binaries to a file."""
-    with open(filename, 'w') as file:
-        for binary in binaries:
-            file.write(f"{binary}\n")
+    """Save the generated binaries to a file, packed when the name ends in '.bin'."""
+    if filename.endswith('.bin'):
+        Program.write_binary(filename, Program.words_from_lines(binaries))
+    else:
+        Program.write_lines(filename, binaries)
+
+def make_words(rng, classes):
+    """
+    Generate one random 32-bit word per entry of ``classes`` (indexes into CLASSES),
+    encoded like generate_32bit_binaries does, as a NumPy array.
+    """
+    classes = np.asarray(classes)
+    words = rng.integers(0, 1 << 32, size=len(classes), dtype=np.uint32)
+    words = (words & KEEP_MASKS[classes]) | PREFIXES[classes]
+    alu = classes == list(CLASSES).index('alu')
+    words[alu] |= ALU_BITS[rng.integers(0, len(ALU_BITS), size=int(alu.sum()))]
+    vector = classes == list(CLASSES).index('vector_alu')
+    if vector.any():
+        words[vector] |= VECTOR_BITS[rng.integers(0, len(VECTOR_BITS), size=int(vector.sum()))]
+    return words
+
+def generate_words(counts=None, total=0, mix=None, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield arrays of at most chunk_size instruction words.
+    - counts: instructions per class name, generated class after class.
+    - total and mix: total instructions interleaved at random with the
+      relative weights of mix (class name -> weight).
+    - seed: makes the output reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    for index, name in enumerate(CLASSES):
+        count = (counts or {}).get(name, 0)
+        for start in range(0, count, chunk_size):
+            yield make_words(rng, np.full(min(chunk_size, count - start), index))
+    if total:
+        weights = np.array([(mix or {}).get(name, 0) for name in CLASSES], dtype=float)
+        if weights.sum() <= 0:
+            raise ValueError("The mix must give a positive weight to at least one class.")
+        for start in range(0, total, chunk_size):
+            size = min(chunk_size, total - start)
+            yield make_words(rng, rng.choice(len(CLASSES), size=size, p=weights / weights.sum()))
+
+def stream_to_file(chunks, total, filename="bits.txt"):
+    """
+    Write chunks of words to a file as they are generated, packed when the
+    name ends in '.bin', with Program.stream_chunks. total is the number of
+    words expected.
+    """
+    written = Program.stream_chunks(filename, chunks)
+    if written != total:
+        raise ValueError(f"Expected {total} instructions, generated {written}.")
+    return written
+
+def parse_mix(text):
+    """Parse a mix such as 'alu=2,write_mem=1' into a class -> weight dict."""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in CLASSES:
+            raise ValueError(f"Unknown instruction class: {name}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
 
-def main():
+def interactive():
     """Main function to handle user input and generate appropriate 32-bit binaries."""
     try:
         # Input for number of write instructions
@@ -108,5 +210,31 @@ def main():
     except ValueError:
         print("Invalid input. Please enter a valid number.")
 
+def main(argv=None):
+    """Generate a program from command-line options, or ask for the counts when none are given."""
+    parser = argparse.ArgumentParser(description="Generate random 32-bit instruction programs.")
+    for name in CLASSES:
+        parser.add_argument("--" + name.replace('_', '-'), type=int, default=0, metavar="N",
+                            help=f"number of {name} instructions, generated in order")
+    parser.add_argument("--count", type=int, default=0, help="number of instructions interleaved by --mix")
+    parser.add_argument("--mix", default="write_mem,write_reg,move_mem,move_reg,alu",
+                        help="class weights for --count, e.g. 'alu=2,write_mem=1' (default: equal)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible programs")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="instructions generated per batch")
+    parser.add_argument("-o", "--output", default="bits.txt", help="output file; '.bin' writes the packed format")
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+    args = parser.parse_args(argv)
+
+    counts = {name: getattr(args, name) for name in CLASSES}
+    total = sum(counts.values()) + args.count
+    if total <= 0:
+        parser.error("at least one instruction must be requested")
+    chunks = generate_words(counts, args.count, parse_mix(args.mix), args.seed, args.chunk_size)
+    stream_to_file(chunks, total, args.output)
+    print(f"Generated {total} 32-bit binary numbers and saved to {args.output}.")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,203 @@
+"""Warm simulation server for Maua-V programs.
+
+Running ``python CPU.py`` once per program pays for the interpreter, the
+``myhdl`` import and the first elaboration of ``system()`` every time. The
+server pays for them once: it keeps a pool of worker processes that have
+already imported the models and run a warm-up program, and hands them the
+programs it receives.
+
+Clients connect to a Unix socket or to a localhost TCP port and send one
+JSON object per line:
+
+    {"id": 1, "words": [536870912, ...], "engine": "myhdl", "max_cycles": null, "timeout": null}
+
+``words`` holds the 32-bit instruction words; ``lines`` with the text lines
+of a program may be sent instead. ``engine``, ``max_cycles`` and ``timeout``
+are optional and work as in Batch.py. For each request the server answers
+with one line: the record of ``Batch.run_program()`` (status, cycles, final
+registers and memory, ...) with the same ``id``. Requests run concurrently,
+also those sent on one connection, so answers may come out of order.
+
+Every job builds a fresh ``system()`` from reset, so no state leaks from one
+program to the next. MyHDL generators cannot be restarted once a
+simulation is over, so what stays warm is the process, not the design.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import signal
+
+import Batch
+import Program
+
+# Longest request line accepted, in bytes (about 5 million instructions).
+MAX_REQUEST = 64 << 20
+
+ENGINES = ('myhdl', 'fast')
+
+
+def _warm():
+    """Worker initializer: import the models and run a tiny program once."""
+    import CPU
+    import FastCPU
+
+    program = Program.decode_words([Program.encode(1, [1, 1])])
+    with contextlib.redirect_stdout(io.StringIO()):
+        CPU.simulate(program)
+    FastCPU.run(program, verbose=False)
+
+
+def _run_task(task):
+    """Pool entry point: run one decoded request."""
+    return Batch.run_program(**task)
+
+
+def parse_request(request):
+    """Check a decoded request and return the keyword arguments of run_program."""
+    if 'words' in request:
+        words = request['words']
+        if not isinstance(words, list) or not all(isinstance(word, int) and 0 <= word < 1 << Program.WORD_BITS
+                                                  for word in words):
+            raise ValueError("'words' deve ser uma lista de palavras de 32 bits")
+    elif 'lines' in request:
+        words = list(Program.words_from_lines([str(linha).strip() for linha in request['lines']]))
+    else:
+        raise ValueError("o pedido precisa de 'words' ou 'lines'")
+    engine = request.get('engine', 'myhdl')
+    if engine not in ENGINES:
+        raise ValueError(f"motor desconhecido: {engine}")
+    return {
+        'path': str(request.get('name', f"pedido-{request.get('id')}")),
+        'engine': engine,
+        'timeout': request.get('timeout'),
+        'max_cycles': request.get('max_cycles'),
+        'words': words,
+    }
+
+
+def _error(ident, message):
+    """Return the answer to a request that could not be run."""
+    return {'id': ident, 'program': None, 'status': 'error', 'cycles': None, 'seconds': None,
+            'error': message, 'registers': None, 'memory': None}
+
+
+class Server:
+    """Accepts connections and runs their requests in a process pool."""
+
+    def __init__(self, jobs=None):
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=_warm, max_tasks_per_child=Batch.TASKS_PER_WORKER)
+        self.served = 0
+
+    async def run(self, line):
+        """Answer one request line."""
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return _error(None, f"JSON inválido: {error}")
+        if not isinstance(request, dict):
+            return _error(None, "o pedido deve ser um objeto JSON")
+        ident = request.get('id')
+        try:
+            task = parse_request(request)
+        except (ValueError, TypeError) as error:
+            return _error(ident, str(error))
+        loop = asyncio.get_running_loop()
+        try:
+            record = await loop.run_in_executor(self.pool, _run_task, task)
+        except concurrent.futures.process.BrokenProcessPool as error:
+            return _error(ident, f"worker perdido: {error}")
+        self.served += 1
+        return dict(record, id=ident)
+
+    async def handle(self, reader, writer):
+        """Serve one connection until the client closes it."""
+        lock = asyncio.Lock()
+        tasks = set()
+        # Set once the client is gone: the answers still running are dropped
+        gone = asyncio.Event()
+
+        async def answer(line):
+            record = await self.run(line)
+            async with lock:
+                if gone.is_set():
+                    return
+                try:
+                    writer.write((json.dumps(record) + '\n').encode())
+                    await writer.drain()
+                except ConnectionError:
+                    gone.set()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Line longer than MAX_REQUEST: nothing sensible is left to read
+                    writer.write((json.dumps(_error(None, "pedido grande demais")) + '\n').encode())
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def serve(self, path=None, port=None):
+        """Listen on a Unix socket ``path`` or on localhost ``port`` until cancelled."""
+        # SIGTERM stops the server like Ctrl-C, so the workers are shut down too
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        if path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.handle, path, limit=MAX_REQUEST)
+        else:
+            server = await asyncio.start_server(self.handle, '127.0.0.1', port, limit=MAX_REQUEST)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if path is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main():
+    """Start the server from the command line."""
+    parser = argparse.ArgumentParser(description="Servidor de simulação Maua-V com processos aquecidos.")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--socket", default="maua.sock", help="socket Unix em que escuta (padrão: maua.sock)")
+    where.add_argument("--port", type=int, default=None, help="escuta em 127.0.0.1 nesta porta TCP")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="processos de simulação (padrão: número de CPUs)")
+    args = parser.parse_args()
+
+    server = Server(args.jobs)
+    where = f"127.0.0.1:{args.port}" if args.port is not None else args.socket
+    print(f"Servidor escutando em {where}")
+    try:
+        asyncio.run(server.serve(None if args.port is not None else args.socket, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        server.close()
+        print(f"Servidor encerrado depois de {server.served} programas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
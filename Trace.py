@@ -0,0 +1,159 @@
+"""Selective VCD tracing for the Maua-V MyHDL model.
+
+MyHDL's ``traceSignals`` always records every signal of the design for the
+whole run. The ``vcd`` block below only records the signals it is given,
+only inside a window of clock cycles, and writes value changes as they
+happen to a plain or gzip-compressed stream.
+"""
+
+import gzip
+
+from myhdl import block, instance, now
+
+# Named groups of signals that can be traced together.
+GROUPS = {
+    'clock': ('clk',),
+    'uc': ('write_enable', 'addr', 'data_in', 'reg_write', 'regWrite_addr',
+           'regRead_addr', 'write_data', 'operation', 'alu_enable', 'aux', 'aux1',
+           'vreg_write', 'vwrite_data', 'flags'),
+    'alu': ('operation', 'num1', 'num2', 'result', 'alu_enable', 'vnum1', 'vnum2', 'vresult'),
+    'memory': ('addr', 'data_in', 'data_out', 'write_enable', 'dma_source', 'dma_destination', 'dma_count'),
+    'register': ('reg_write', 'regWrite_addr', 'regRead_addr', 'write_data', 'read_data',
+                 'vreg_write', 'vwrite_data', 'vread_data'),
+    'regs': None,  # every register of the register file
+    'mem': None,   # every memory word
+}
+
+
+class Word:
+    """One word of an array-backed memory, traced like a Signal of ``width`` bits.
+
+    written: Signal the memory toggles when one of its words changes
+    """
+
+    def __init__(self, buffer, index, width, written):
+        self.buffer = buffer
+        self.index = index
+        self.width = width
+        self.written = written
+
+    def __int__(self):
+        return int(self.buffer[self.index])
+
+    def __len__(self):
+        return self.width
+
+
+def select(signals, spec=None):
+    """Pick the signals named by ``spec`` from a name -> Signal dict.
+
+    ``spec`` is a comma-separated list of group names from GROUPS and
+    signal names; ``None`` or ``'all'`` selects every signal.
+    """
+    if spec is None or spec == 'all':
+        return dict(signals)
+    selected = {}
+    for name in spec.split(','):
+        name = name.strip()
+        if name in ('regs', 'mem'):
+            names = [key for key in signals if key.startswith(name + '[')]
+        elif name in GROUPS:
+            names = GROUPS[name]
+        elif name in signals:
+            names = [name]
+        else:
+            raise ValueError(f"Sinal ou grupo desconhecido: {name}")
+        for key in names:
+            selected[key] = signals[key]
+    return selected
+
+
+def names(register_count, memory_size):
+    """Return a name -> None dict of every signal system() can trace, for select()."""
+    signals = dict.fromkeys(name for group in GROUPS.values() if group for name in group)
+    signals.update(dict.fromkeys(f'regs[{i}]' for i in range(register_count)))
+    signals.update(dict.fromkeys(f'mem[{i}]' for i in range(memory_size)))
+    return signals
+
+
+def open_stream(filename):
+    """Open a VCD output file, gzip-compressed when it ends in ``.gz``."""
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'wt')
+    return open(filename, 'w')
+
+
+def _identifier(index):
+    """Return the short VCD identifier code of the index-th signal."""
+    code = ''
+    while True:
+        code += chr(33 + index % 94)
+        index //= 94
+        if index == 0:
+            return code
+
+
+def _value(width, value):
+    """Format a value change for a signal of the given width."""
+    if width == 1:
+        return f"{int(value)}"
+    return f"b{int(value):b} "
+
+
+@block
+def vcd(clk, signals, stream, period, start=0, stop=None):
+    """Write the value changes of ``signals`` between two clock cycles.
+
+    clk: the system clock, used to find the current cycle
+    signals: name -> Signal (or Word) dict of what to record
+    stream: text stream the VCD is written to
+    period: simulated time units per clock cycle
+    start, stop: first cycle recorded and first cycle no longer recorded
+    """
+    names = list(signals)
+    sigs = [signals[name] for name in names]
+    widths = [len(sig) or 32 for sig in sigs]
+    codes = [_identifier(i) for i in range(len(sigs))]
+
+    stream.write("$timescale 1ns $end\n$scope module system $end\n")
+    for name, width, code in zip(names, widths, codes):
+        stream.write(f"$var wire {width} {code} {name} $end\n")
+    stream.write("$upscope $end\n$enddefinitions $end\n")
+
+    # Waking up on every clock change lets the window open even when none
+    # of the traced signals changes on that cycle. Words wake the block
+    # through the Signal their memory toggles.
+    sources = [sig.written if isinstance(sig, Word) else sig for sig in sigs]
+    triggers = tuple({id(sig): sig for sig in [clk] + sources}.values())
+
+    @instance
+    def dump():
+        last = None
+        written = None
+        while True:
+            yield triggers
+            cycle = (now() + period // 2) // period
+            if stop is not None and cycle >= stop:
+                stream.flush()
+                return
+            if cycle < start:
+                continue
+            values = [int(sig) for sig in sigs]
+            if last is None:
+                stream.write(f"#{now()}\n$dumpvars\n")
+                for width, code, value in zip(widths, codes, values):
+                    stream.write(f"{_value(width, value)}{code}\n")
+                stream.write("$end\n")
+                written = now()
+            else:
+                changes = [i for i, value in enumerate(values) if value != last[i]]
+                if changes:
+                    # Delta cycles can report several changes at one time
+                    if written != now():
+                        stream.write(f"#{now()}\n")
+                        written = now()
+                    for i in changes:
+                        stream.write(f"{_value(widths[i], values[i])}{codes[i]}\n")
+            last = values
+
+    return dump
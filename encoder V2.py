@@ -1,3 +1,25 @@
+import argparse
+
+import Program
+
+parser = argparse.ArgumentParser(description="Monta instruções Maua-V de forma interativa.")
+# Arquivo de saída: bits.txt por padrão; um nome terminado em .bin grava o formato binário
+parser.add_argument("saida", nargs="?", default="bits.txt", help="arquivo de saída (padrão: bits.txt)")
+parser.add_argument("--memory-size", type=int, default=Program.MEMORY_SIZE, help="palavras de memória")
+parser.add_argument("--registers", type=int, default=Program.REGISTER_COUNT, help="número de registradores")
+parser.add_argument("--word-width", type=int, default=Program.WORD_WIDTH, help="bits por palavra de dados")
+args = parser.parse_args()
+saida = args.saida
+geometria = Program.geometry(args.memory_size, args.registers, args.word_width)
+# Larguras dos campos: endereço de memória, registrador, valor, operação,
+# função e deslocamento dos desvios
+A = geometria['address_bits']
+R = geometria['register_bits']
+V = geometria['word_width']
+O = Program.OPERATION_BITS
+F = Program.FUNCTION_BITS
+D = Program.OFFSET_BITS
+W = geometria['word_bits']
 linhas=[]
 while(True):
     print("Digite o tipo da instrução")
@@ -8,16 +30,20 @@ while(True):
     print("5- M.R.")
     print("6- M.R.M.")
     print("7- M.M.R.")
-    print("8- Sair")
+    print("8- R.R.")
+    print("9- Sair")
+    print("10- C.M.P.")
+    print("11- Desvios (J.M.P., B.E.Q., B.N.E., B.L.T., B.G.E.)")
+    print("12- B.M. (cópia em bloco)")
     tipo =int(input("Digite o numero da instrução: "))
     if(tipo == 1):
         addr1 = int(input("Digite o endereço da memória: "))
         value = int(input("Digite o valor para escrever na memória: "))
-        linhas.append('000'+str(format(addr1, 'b').zfill(8))+str(format(value, 'b').zfill(8))+'0000000000000\n')
+        linhas.append(('000'+str(format(addr1, 'b').zfill(A))+str(format(value, 'b').zfill(V))).ljust(W, '0')+'\n')
     if(tipo == 2):
         addr1 = int(input("Digite o endereço do registrador: "))
         value = int(input("Digite o valor para escrever no registrador: "))
-        linhas.append('001'+str(format(addr1, 'b').zfill(5))+str(format(value, 'b').zfill(8))+'0000000000000000\n')
+        linhas.append(('001'+str(format(addr1, 'b').zfill(R))+str(format(value, 'b').zfill(V))).ljust(W, '0')+'\n')
     if(tipo == 3):
         num1 = int(input("Digite o endereço do numero no registrador: "))
         print("0- (+)")
@@ -33,35 +59,66 @@ while(True):
         print("10- XOR")
         print("11- XNOR")
         print("12- NOT")
+        # Operações vetoriais: cada faixa de 8 bits do registrador de 32 bits
+        print("16- VADD (+ por faixa)")
+        print("17- VSUB (- por faixa)")
+        print("18- VAND")
+        print("19- VOR")
+        print("20- VXOR")
+        print("21- VNOT")
+        print("22- VINS (desloca as faixas e insere a faixa 0 do segundo)")
         operation= int(input("Digite o numero da operação: "))
         num2 = int(input("Digite o endereço do numero no registrador: "))
         result = int(input("Digite o endereço no qual o resultado será salvo: "))
-        linhas.append('010'+str(format(num1, 'b').zfill(5))+str(format(operation, 'b').zfill(5))+str(format(num2, 'b').zfill(5))+str(format(result, 'b').zfill(5))+'000000000\n')
+        linhas.append(('010'+str(format(num1, 'b').zfill(R))+str(format(operation, 'b').zfill(O))+str(format(num2, 'b').zfill(R))+str(format(result, 'b').zfill(R))).ljust(W, '0')+'\n')
     if(tipo == 4):
         addr1 = int(input("Digite o endereço da memoria de base: "))
         aux = int(input("Digite o endereço da memoria do auxiliar: "))
         addr2 = int(input("Digite o endereço da memoria do destino: "))
-        linhas.append('011'+str(format(addr1, 'b').zfill(8))+str(format(aux, 'b').zfill(8))+str(format(addr2, 'b').zfill(8))+'00000\n')
+        linhas.append(('011'+str(format(addr1, 'b').zfill(A))+str(format(aux, 'b').zfill(A))+str(format(addr2, 'b').zfill(A))).ljust(W, '0')+'\n')
     if(tipo == 5):
         addr1 = int(input("Digite o endereço do registrador de base: "))
         aux = int(input("Digite o endereço do registrador do auxiliar: "))
         addr2 = int(input("Digite o endereço do registrador do destino: "))
-        linhas.append('100'+str(format(addr1, 'b').zfill(5))+str(format(aux, 'b').zfill(5))+str(format(addr2, 'b').zfill(5))+'00000000000000\n')
+        linhas.append(('100'+str(format(addr1, 'b').zfill(R))+str(format(aux, 'b').zfill(R))+str(format(addr2, 'b').zfill(R))).ljust(W, '0')+'\n')
     if(tipo == 6):
        addr1 = int(input("Digite o endereço do registrador de base: "))
        addr2 = int(input("Digite o endereço da memória de destino: "))
-       linhas.append('101'+str(format(addr1, 'b').zfill(5))+str(format(addr2, 'b').zfill(8))+'0000000000000000\n')
+       linhas.append(('101'+str(format(addr1, 'b').zfill(R))+str(format(addr2, 'b').zfill(A))).ljust(W, '0')+'\n')
     if(tipo == 7):
        addr1 = int(input("Digite o endereço da memória de base: "))
        addr2 = int(input("Digite o endereço do registrador de destino: "))
-       linhas.append('110'+str(format(addr1, 'b').zfill(8))+str(format(addr2, 'b').zfill(5))+'0000000000000000\n')
+       linhas.append(('110'+str(format(addr1, 'b').zfill(A))+str(format(addr2, 'b').zfill(R))).ljust(W, '0')+'\n')
     if(tipo == 8):
         addr1 = int(input("Digite o endereço do registrador que deseja limpar: "))
-        linhas.append('111'+str(format(addr1, 'b').zfill(5))+'000000000000000000000\n')
+        linhas.append(('111'+str(format(addr1, 'b').zfill(R))).ljust(W, '0')+'\n')
     if(tipo ==9):
         break
+    if(tipo == 10):
+        num1 = int(input("Digite o endereço do primeiro registrador: "))
+        num2 = int(input("Digite o endereço do segundo registrador: "))
+        linhas.append(('111'+str(format(num1, 'b').zfill(R))+str(format(1, 'b').zfill(F))+str(format(num2, 'b').zfill(R))).ljust(W, '0')+'\n')
+    if(tipo == 11):
+        print("2- J.M.P. (sempre)")
+        print("3- B.E.Q. (igual)")
+        print("4- B.N.E. (diferente)")
+        print("5- B.L.T. (menor)")
+        print("6- B.G.E. (maior ou igual)")
+        funcao = int(input("Digite o numero do desvio: "))
+        # Deslocamento com sinal, contado a partir do próprio desvio (-1 volta uma instrução)
+        desvio = int(input("Digite o deslocamento do desvio: "))
+        linhas.append(('111'+str(format(0, 'b').zfill(R))+str(format(funcao, 'b').zfill(F))+str(format(0, 'b').zfill(R))+str(format(desvio % (1 << D), 'b').zfill(D))).ljust(W, '0')+'\n')
+    if(tipo == 12):
+        # Os endereços de origem e de destino ficam em registradores
+        addr1 = int(input("Digite o endereço do registrador com o endereço de origem: "))
+        addr2 = int(input("Digite o endereço do registrador com o endereço de destino: "))
+        tamanho = int(input("Digite o número de palavras a copiar: "))
+        linhas.append(('111'+str(format(addr1, 'b').zfill(R))+str(format(7, 'b').zfill(F))+str(format(addr2, 'b').zfill(R))+str(format(tamanho, 'b').zfill(D))).ljust(W, '0')+'\n')
     print(linhas)
-with open("bits.txt", "w") as arquivo:
-    arquivo.writelines(linhas)
+if saida.endswith(".bin"):
+    Program.write_binary(saida, Program.words_from_lines([linha.strip() for linha in linhas], W), W)
+else:
+    with open(saida, "w") as arquivo:
+        arquivo.writelines(linhas)
 
     
\ No newline at end of file